@@ -0,0 +1,79 @@
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import traceback
+
+def listar_trimestres(ultimo_ano=2024, ultimo_tri=2, primeiro_ano=2012):
+    """
+    Lista os pares (ano, trimestre) de {primeiro_ano}.1 até {ultimo_ano}.{ultimo_tri}, em ordem.
+    """
+
+    return [(ano, tri)
+            for ano in range(primeiro_ano, ultimo_ano + 1)
+            for tri in range(1, 5)
+            if not (ano == ultimo_ano and tri > ultimo_tri)]
+
+def _executar_tarefa(funcao, args):
+    # Captura o erro dentro do processo filho para que um trimestre não derrube os demais
+    try:
+        return funcao(*args), None
+    except Exception:
+        return None, traceback.format_exc()
+
+def executar_trimestres(funcao, tarefas, workers=1):
+    """
+    Executa funcao(*args) para cada tupla de argumentos em 'tarefas', usando até 'workers' processos.
+    Retorna uma lista, na mesma ordem de 'tarefas', de tuplas (args, resultado, erro),
+    onde 'erro' é None quando a tarefa terminou com sucesso.
+    """
+
+    resultados = []
+
+    if workers <= 1:
+        for args in tarefas:
+            resultado, erro = _executar_tarefa(funcao, args)
+            resultados.append((args, resultado, erro))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futuros = [pool.submit(_executar_tarefa, funcao, args) for args in tarefas]
+
+            for args, futuro in zip(tarefas, futuros):
+                try:
+                    resultado, erro = futuro.result()
+                except Exception as e:
+                    # ex.: o processo filho morreu (falta de memória)
+                    resultado, erro = None, repr(e)
+                resultados.append((args, resultado, erro))
+
+    relatar_falhas(resultados)
+
+    return resultados
+
+def relatar_falhas(resultados):
+    """
+    Imprime um resumo das tarefas que falharam.
+    """
+
+    falhas = [(args, erro) for args, _, erro in resultados if erro is not None]
+
+    if not falhas:
+        print(f"\n{len(resultados)} tarefas concluídas sem erros.")
+        return
+
+    print(f"\n{len(falhas)} de {len(resultados)} tarefas falharam:")
+    for args, erro in falhas:
+        # Mostra apenas a última linha do traceback (tipo e mensagem do erro)
+        print(f"  - {args}: {erro.strip().splitlines()[-1]}")
+
+def criar_parser(descricao, incremental=False):
+    """
+    Cria o parser de linha de comando comum aos scripts que percorrem os trimestres.
+    Com incremental=True inclui a opção --forcar, que ignora o manifesto e reprocessa todos os painéis.
+    """
+
+    parser = argparse.ArgumentParser(description=descricao)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Número de processos usados para processar os trimestres em paralelo (padrão: 1)")
+    if incremental:
+        parser.add_argument("--forcar", action="store_true",
+                            help="Reprocessa todos os painéis, mesmo os que não mudaram desde a última execução")
+    return parser
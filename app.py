@@ -1,89 +1,137 @@
+import time
+inicio_execucao = time.perf_counter()
+
 import streamlit as st
 import pandas as pd
 import altair as alt
-import matplotlib.pyplot as plt
-import matplotlib.ticker as mticker
+from contextlib import nullcontext
+import io
+import os
+import glob
+import json
+import threading
+# O matplotlib só é importado dentro de render_variacao_nula, quando a Metodologia é exibida
+from grupos import grupos_suffix, deflator_suffix, abas_grupos, rotulos_grupos
+from metricas import (compilar_metricas, adicionar_periodo, serie_grupo, series_grupos,
+                      limites_serie, nome_arquivo_resumo)
+from cubo import carregar_cubo, consultar_cubo, dimensoes_cubo, nome_arquivo_cubo
+
+# Com WAGE_TRACKER_PERFIL=1, cada execução do script imprime o tempo gasto em imports, carga e renderização
+PERFIL = os.environ.get("WAGE_TRACKER_PERFIL") == "1"
+fim_imports = time.perf_counter()
 
 st.set_page_config(page_title="Wage Tracker", layout="wide")
 
 # --- Configuração dos Arquivos ---
-
-# Mapeia os nomes das abas/grupos para os sufixos dos arquivos
-grupos_suffix = {
-    "Base": "_0",
-    "Trabalhador de App": "_1",
-    "Job Switcher": "_2",
-    "Masculino": "_3",
-    "Feminino": "_4",
-    "Norte": '_5',
-    "Nordeste": '_6',
-    "Sudeste": '_7',
-    'Sul': '_8',
-    'Centro-Oeste': '_9',
-    "Carteira Assinada": "_10",
-    "Média": "_11",
-    "Percentil 25": "_12",
-    "Percentil 75": "_13",
-    "14-24 anos": "_14",
-    "25-54 anos": "_15",
-    "55+ anos": "_16",
-    "Branca": "_171",
-    "Preta": "_172",
-    "Amarela": "_173",
-    "Parda": "_174",
-    "Indígena": "_175",
-    "Sem instrução": "_181",
-    "Fundamental incompleto": "_182",
-    "Fundamental completo": "_183",
-    "Médio incompleto": "_184",
-    "Médio completo": "_185",
-    "Superior incompleto": "_186",
-    "Superior completo": "_187",
-    "Diretores e gerentes":"_191",
-    "Prof. das ciências e intelectuais":"_192",
-    "Prof. de nível médio":"_193",
-    "Trab. de apoio adm.":"_194",
-    "Trab. de serv. e vend.":"_195",
-    "Trab. ambientais qualificados":"_196",
-    "Trab. urbanos qualificados":"_197",
-    "Operadores de máquinas":"_198",
-    "Ocupações elementares":"_199",
-    "Militares":"_190",
-    "Comércios": "_201",
-    "Serviços": "_202",
-    "Indústrias": "_203",
-    "Classe A": "_21A",
-    "Classe B": "_21B",
-    "Classe C": "_21C",
-    "Classe D": "_21D",
-    "Classe E": "_21E",
-    "Cluster 0": "_22_0",
-    "Cluster 1": "_22_1"
-}
-
-# Mapeia a opção do deflator para o sufixo
-deflator_suffix = {
-    "Sim": "D",
-    "Não": ""
-}
+# Os grupos (grupos_suffix), as opções de deflator (deflator_suffix) e as
+# visualizações (abas_grupos) ficam em grupos.py
 
 # Caminho base para os arquivos CSV
 # Ajuste este caminho se seus arquivos CSV estiverem em outro lugar
 arquivo_base = "./dados_medianas_var"
 
-@st.cache_data
-def load_data(suffix):
-    """Carrega o DataFrame com base no sufixo do filtro."""
-    file_path = f"{arquivo_base}/medianas_variacao_renda{suffix}.csv"
+# --- Versões dos Dados ---
+# Os loaders abaixo recebem a versão (mtime, tamanho) do arquivo que leem como parte da chave
+# do cache: quando o pipeline regrava um arquivo, apenas as entradas que dependem dele mudam.
+
+# Intervalo (segundos) entre as verificações de mudança nos arquivos de dados
+INTERVALO_VERIFICACAO = 30
+
+# Nome da versão -> arquivo (em arquivo_base) do qual ela depende
+arquivos_dados = {
+    "metricas": "metricas.parquet",
+    "variacao_nula": "estatisticas_variacao_nula.csv",
+    "classes_pareamento": "contagem_classe_pareamento.csv",
+    "grupos_domesticos": "contagem_grupos_domesticos.csv",
+    "resumo": nome_arquivo_resumo,
+    "cubo": nome_arquivo_cubo,
+}
+
+def versao_arquivo(file_path):
+    """Versão barata de um arquivo: (mtime, tamanho), ou None se ele não existir."""
     try:
-        df = pd.read_csv(file_path)
-        return df
+        info = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (info.st_mtime_ns, info.st_size)
+
+def ler_versoes(base_path):
+    """
+    Manifesto das versões dos arquivos de dados do app.
+    Sem o metricas.parquet, a versão das métricas vem dos CSVs por grupo (usados como fallback).
+    """
+    versoes = {nome: versao_arquivo(f"{base_path}/{arquivo}") for nome, arquivo in arquivos_dados.items()}
+    if versoes["metricas"] is None:
+        csvs = sorted(glob.glob(f"{base_path}/medianas_variacao_renda_*.csv"))
+        versoes["metricas"] = tuple(versao_arquivo(file) for file in csvs)
+    return versoes
+
+@st.cache_resource
+def versoes_publicadas(base_path):
+    """
+    Versões em uso por todas as sessões. Só são trocadas pelo vigia_dados depois que o cache
+    da nova versão foi aquecido, para que nenhum usuário pague a carga fria.
+    """
+    return {"versoes": ler_versoes(base_path)}
+
+@st.cache_data(max_entries=4)
+def load_metrics(base_path, versao=None):
+    """
+    Carrega o arquivo consolidado de métricas (formato longo, um único Parquet).
+    Se ele ainda não foi gerado, compila em memória a partir dos CSVs por grupo.
+    A coluna 'periodo' do eixo X é calculada aqui, uma única vez.
+    """
+    file_path = f"{base_path}/metricas.parquet"
+    try:
+        metricas = pd.read_parquet(file_path)
+    except FileNotFoundError:
+        metricas = compilar_metricas(base_path)
+    return adicionar_periodo(metricas)
+
+@st.cache_data(max_entries=4)
+def load_resumo_metricas(base_path, versao=None):
+    """
+    Carrega o resumo das métricas (limites da Base por deflator) usado nos filtros da sidebar.
+    Retorna um dicionário vazio se o resumo ainda não foi gerado.
+    """
+    file_path = f"{base_path}/{nome_arquivo_resumo}"
+    try:
+        with open(file_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+@st.cache_resource(max_entries=2)
+def load_cubo(base_path, versao=None):
+    """
+    Carrega o cubo de variações por indivíduo (cubo.py) usado no grupo personalizado.
+    Fica em cache_resource (sem cópia a cada consulta): os arrays são apenas lidos.
+    Retorna None se o cubo ainda não foi gerado.
+    """
+    try:
+        return carregar_cubo(base_path)
     except FileNotFoundError:
-        st.error(f"Arquivo de dados não encontrado: {file_path}")
-        return pd.DataFrame() # Retorna um DataFrame vazio se o arquivo não existir
+        return None
+
+versoes = versoes_publicadas(arquivo_base)["versoes"]
+
+# Sufixo completo do arquivo (grupo + deflator) -> (grupo, deflacionado)
+sufixo_para_grupo = {
+    sufixo + codigo: (grupo, codigo == "D")
+    for grupo, sufixo in grupos_suffix.items()
+    for codigo in deflator_suffix.values()
+}
+
+def load_data(suffix):
+    """Carrega o DataFrame com base no sufixo do filtro (recorte do arquivo de métricas)."""
+    grupo, deflacionado = sufixo_para_grupo[suffix]
+    df = serie_grupo(load_metrics(arquivo_base, versoes["metricas"]), grupo, deflacionado)
+    if df.empty:
+        st.error(f"Dados não encontrados para o grupo: {grupo}")
+    return df
 
-@st.cache_data
-def load_data_variacao_nula(base_path):
+@st.cache_data(max_entries=4)
+def load_data_variacao_nula(base_path, versao=None):
     """Carrega os dados para o gráfico de variação nula."""
     # Assume que o arquivo está na mesma pasta base dos outros
     file_path = f"{base_path}/estatisticas_variacao_nula.csv"
@@ -96,8 +144,8 @@ def load_data_variacao_nula(base_path):
         st.error(f"Arquivo não encontrado para o gráfico de metodologia: {file_path}")
         return None
 
-@st.cache_data
-def load_data_classes_pareamento(base_path):
+@st.cache_data(max_entries=4)
+def load_data_classes_pareamento(base_path, versao=None):
     """
     Carrega e transforma os dados de percentual das classes de pareamento
     para um formato "longo".
@@ -127,8 +175,8 @@ def load_data_classes_pareamento(base_path):
     
     return df_long
   
-@st.cache_data
-def load_data_grupos_domesticos(base_path):
+@st.cache_data(max_entries=4)
+def load_data_grupos_domesticos(base_path, versao=None):
     """
     Carrega os dados de proporção de domicilios com 1 grupo doméstico.
     """
@@ -159,15 +207,21 @@ deflator_selecionado = st.sidebar.radio(
 codigo_deflator = deflator_suffix[deflator_selecionado]
 
 # Filtro 2: Range de Anos
-df_base_temp = load_data(grupos_suffix["Base"] + codigo_deflator)
+# Os limites vêm do resumo gravado junto com as métricas, sem carregar as séries;
+# sem o resumo, são calculados a partir da série Base
+limites = load_resumo_metricas(arquivo_base, versoes["resumo"]).get(codigo_deflator)
+
+if limites is None:
+    df_base_temp = load_data(grupos_suffix["Base"] + codigo_deflator)
+    if not df_base_temp.empty:
+        limites = limites_serie(df_base_temp)
 
-if not df_base_temp.empty:
+if limites is not None:
     # Lógica para o Filtro de Anos
-    years = sorted(df_base_temp["ano_final"].unique())
-    min_yr, max_yr = int(min(years)), int(max(years))
+    min_yr, max_yr = limites["ano_min"], limites["ano_max"]
     
-    min_y_val = df_base_temp['mediana_variacao'].min()
-    max_y_val = df_base_temp['mediana_variacao'].max()
+    min_y_val = limites["mediana_min"]
+    max_y_val = limites["mediana_max"]
     
     # Adiciona um buffer de 20% no slider para dar espaço (10% para cima, 10% para baixo)
     y_buffer = (max_y_val - min_y_val) * 2.5
@@ -206,31 +260,56 @@ y_range_values = (y_range_pct[0] / 100.0, y_range_pct[1] / 100.0)
 # --- Variável global para a cor da linha Base ---
 BASE_COLOR = '#606060' # Cinza escuro
 
-def create_combined_chart(df, group_column=None):
+# Nome do dataset referenciado pelos gráficos combinados (os dados vão à parte, em 'datasets')
+DADOS_GRAFICO = "serie"
+
+def create_combined_chart(df, year_range, y_range_values, group_column=None):
     """
-    Cria um gráfico combinado (Renda + Observações) para o DataFrame fornecido.
-    Filtra os dados com base no year_range global.
+    Cria a especificação Vega-Lite do gráfico combinado (Renda + Observações) para o DataFrame fornecido.
+    Filtra os dados com base no year_range e usa y_range_values como domínio do eixo Y.
     Se 'group_column' for fornecido, cria um grafico de múltiplas linhas.
+    Os dados não são embutidos nos painéis: entram uma única vez em 'datasets' e são referenciados pelo nome.
+    Retorna None se não houver dados no período.
     """
     
     # Filtra o DataFrame pelo range de anos da sidebar
     filtered_df = df[(df["ano_final"] >= year_range[0]) & (df["ano_final"] <= year_range[1])]
     
     if filtered_df.empty:
-        st.warning("Nao há dados para os filtros selecionados neste periodo.")
         return None
 
-    # Cria a coluna 'periodo' para o eixo X
-    filtered_df = filtered_df.assign(
-        periodo = filtered_df['ano_final'].astype(str) + '.' + filtered_df['trimestre'].astype(str)
-    )
+    # A coluna 'periodo' normalmente já vem de load_metrics; cria apenas se faltar
+    if "periodo" not in filtered_df:
+        filtered_df = filtered_df.assign(
+            periodo = filtered_df['ano_final'].astype(str) + '.' + filtered_df['trimestre'].astype(str)
+        )
+
+    # Intervalo de confiança (bootstrap), quando as métricas o incluem
+    tem_intervalo = 'ic_inferior' in filtered_df and filtered_df['ic_inferior'].notna().any()
+    colunas_intervalo = ['ic_inferior', 'ic_superior'] if tem_intervalo else []
+
+    # Mantém apenas as colunas usadas pelos gráficos, em tipos compactos
+    colunas = ['periodo', 'mediana_variacao', 'obs'] + colunas_intervalo + ([group_column] if group_column else [])
+    dados = filtered_df[colunas].astype({
+        'periodo': 'category',
+        'mediana_variacao': 'float32',
+        'obs': 'int32',
+        **{coluna: 'float32' for coluna in colunas_intervalo},
+        **({group_column: 'category'} if group_column else {}),
+    })
 
     # --- Define as configurações de cor e tooltip ---
+    # (os tipos são explícitos pois o gráfico referencia os dados pelo nome)
     tooltip_list = [
-        'periodo',
-        alt.Tooltip('mediana_variacao', format='.1%'),
-        alt.Tooltip('obs')
+        alt.Tooltip('periodo:O'),
+        alt.Tooltip('mediana_variacao:Q', format='.1%'),
+        alt.Tooltip('obs:Q')
     ]
+    if tem_intervalo:
+        tooltip_list += [
+            alt.Tooltip('ic_inferior:Q', format='.1%', title='IC 95% (inferior)'),
+            alt.Tooltip('ic_superior:Q', format='.1%', title='IC 95% (superior)'),
+        ]
 
     if group_column and len(filtered_df[group_column].unique()) > 1:
         # Lógica para MÚLTIPLOS GRUPOS (Incluindo Base)
@@ -268,6 +347,7 @@ def create_combined_chart(df, group_column=None):
             bind="legend",
         )
         opacidade = alt.condition(selection, alt.value(1), alt.value(0.1))
+        opacidade_banda = alt.condition(selection, alt.value(0.2), alt.value(0.02))
         p = [selection]
         color_base = color_encoding # Usa a codificação de cor
         
@@ -276,29 +356,44 @@ def create_combined_chart(df, group_column=None):
         # A cor é definida diretamente para BASE_COLOR
         color_base = alt.ColorValue(BASE_COLOR)
         opacidade = alt.value(1)
+        opacidade_banda = alt.value(0.2)
         p = []
 
 
     # Gráfico base
-    base = alt.Chart(filtered_df).encode(
+    base = alt.Chart(alt.NamedData(DADOS_GRAFICO)).encode(
         x=alt.X("periodo:O", title="Ano.Trimestre"),
         tooltip=tooltip_list,
         opacity=opacidade
     ).add_params(*p)
 
     # Gráfico 1: Variação da Renda
+    eixo_y = dict(
+        title="Variação Mediana da Renda",
+        axis=alt.Axis(format=".1%"),
+        scale=alt.Scale(domain=[y_range_values[0], y_range_values[1]], clamp=True)
+    )
     chart_renda = base.mark_line().encode(
-        y=alt.Y("mediana_variacao:Q",
-                title="Variação Mediana da Renda",
-                axis=alt.Axis(format=".1%"),
-                scale=alt.Scale(domain=[y_range_values[0], y_range_values[1]], clamp=True)
-                ),
+        y=alt.Y("mediana_variacao:Q", **eixo_y),
         # Usa a cor definida de forma condicional
         color=color_base
-    ).properties(
-        height=400
     ).interactive() # Permite zoom e pan
 
+    if tem_intervalo:
+        # Banda do intervalo de confiança por baixo da linha, na mesma cor do grupo
+        banda = alt.Chart(alt.NamedData(DADOS_GRAFICO)).mark_area().encode(
+            x=alt.X("periodo:O", title="Ano.Trimestre"),
+            y=alt.Y("ic_inferior:Q", **eixo_y),
+            y2="ic_superior:Q",
+            color=color_base,
+            opacity=opacidade_banda
+        )
+        chart_renda = alt.layer(banda, chart_renda)
+
+    chart_renda = chart_renda.properties(
+        height=400
+    )
+
     # Gráfico 2: Número de Observações
     chart_obs = base.mark_line(point=False).encode(
         y=alt.Y("obs:Q", title="N (Amostras)"),
@@ -317,33 +412,156 @@ def create_combined_chart(df, group_column=None):
     ).configure_view(
         stroke = None # Remove a borda
     )
-    
-    return combined_chart
 
-# --- Corpo Principal da Página (com Abas) ---
+    # Como no st.altair_chart, desativa o tema padrão do Altair (larguras/alturas fixas)
+    tema = alt.theme.enable("none") if alt.theme.active == "default" else nullcontext()
+    with tema:
+        spec = combined_chart.to_dict()
 
-st.title("Mediana da Variação da Renda")
+    # Um único dataset para os dois painéis; o Streamlit o envia em Arrow (colunar) em vez de JSON
+    spec["datasets"] = {DADOS_GRAFICO: dados}
+    return spec
+
+@st.cache_data(max_entries=128)
+def load_series_grupos(grupos, deflacionado, versao=None):
+    """Recorta do arquivo de métricas as séries de uma visualização (grupos na ordem de exibição)."""
+    return series_grupos(load_metrics(arquivo_base, versao), list(grupos), deflacionado, rotulos=rotulos_grupos)
+
+@st.cache_resource(max_entries=64)
+def chart_spec_grupos(grupos, deflacionado, year_range, y_range_values, versao=None):
+    """
+    Especificação Vega-Lite pronta do gráfico combinado de uma visualização, memorizada por
+    (grupos, deflator, range de anos, range do eixo Y, versão das métricas) em um cache LRU limitado:
+    alternar entre visualizações e deflatores já vistos não refaz o filtro, as cores nem a validação do Altair.
+    Retorna None se não houver dados no período.
+    """
+    df = load_series_grupos(grupos, deflacionado, versao)
+
+    if len(grupos) == 1:
+        # Chamamos SEM 'group_column' para forçar a lógica de grupo único e cor BASE_COLOR
+        return create_combined_chart(df, year_range, y_range_values)
+    return create_combined_chart(df, year_range, y_range_values, group_column="Grupo")
+
+@st.cache_data(max_entries=64)
+def serie_personalizada(filtros, deflacionado, versao=None):
+    """
+    Série do grupo personalizado (filtros: tupla de (dimensão, códigos aceitos)) junto com a Base,
+    no formato de load_series_grupos, calculada a partir do cubo.
+    """
+    cubo = load_cubo(arquivo_base, versao)
+
+    # Nome do grupo: rótulos das categorias escolhidas em cada dimensão (ex.: "Feminino × Nordeste")
+    nome = " × ".join(
+        " ou ".join(dimensoes_cubo[dimensao][1][codigo] for codigo in codigos)
+        for dimensao, codigos in filtros
+    )
+
+    partes = [
+        consultar_cubo(cubo, {}, deflacionado).assign(Grupo="Base"),
+        consultar_cubo(cubo, dict(filtros), deflacionado).assign(Grupo=nome),
+    ]
+    return adicionar_periodo(pd.concat(partes, ignore_index=True))
+
+@st.cache_data(max_entries=8)
+def render_variacao_nula(df_nula):
+    """
+    Gera o gráfico de proporção de variação de renda nula e devolve os bytes do PNG.
+    Fica em cache pelo conteúdo dos dados: as interações seguintes reaproveitam a imagem
+    sem refazer a figura. Usa a API de Figure (sem pyplot), então nada fica aberto na memória.
+    """
+    import matplotlib.style as mstyle
+    import matplotlib.ticker as mticker
+    from matplotlib.figure import Figure
+
+    with mstyle.context('seaborn-v0_8-whitegrid'):
+        fig = Figure(figsize = (15, 8))
+        ax = fig.subplots()
+
+        ax.plot(df_nula['ano_tri'], df_nula['percentual_zero'], marker = 'o', linestyle = '-', label='Proporção com Variação = 0%')
+        ax.plot(df_nula['ano_tri'], df_nula['percentual_menor_igual_zero'], marker='s', linestyle='--', label='Proporção com Variação <= 0%')
+
+        # add linha em 50%
+        ax.axhline(y=0.5, color='red', linestyle=':', linewidth=1.5, label='Limite de 50% (Mediana = 0)')
+
+        ax.set_title('Proporção de Indivíduos com Variação de Renda Nula ou Negativa', fontsize=16)
+        ax.set_xlabel('Período (Ano-Trimestre)', fontsize=12)
+        ax.set_ylabel('Proporção', fontsize=12)
+
+        ax.yaxis.set_major_formatter(mticker.PercentFormatter(xmax=1.0))
+
+        ylim_max = 0.6
+        if not df_nula['percentual_menor_igual_zero'].empty:
+            ylim_max = max(df_nula['percentual_menor_igual_zero'].max() * 1.1, 0.6)
+
+        ax.set_ylim(0, ylim_max)
+        for rotulo in ax.get_xticklabels():
+            rotulo.set(rotation=45, ha='right')
+        ax.xaxis.set_major_locator(mticker.MaxNLocator(20))
+
+        ax.legend(fontsize=11)
+        fig.tight_layout()
+
+        # Mesmas opções de exportação do st.pyplot
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", dpi=200, bbox_inches="tight")
+
+    return buffer.getvalue()
 
-# Cria as abas
-tab_metodologia, tab_base, tab_app, tab_switcher, tab_sexo, tab_regioes, tab_carteira, tab_quartis, tab_idade, tab_rac, tab_edu, tab_ocp, tab_div, tab_classes, tab_clusters = st.tabs([
-    "Metodologia",
-    "Base",
-    "Trabalhador de App",
-    "Job Switcher",
-    "Sexo",
-    "Regiões",
-    "Carteira Assinada",
-    "Quartis",
-    "Faixa Etária",
-    "Cor ou raça",
-    "Nível educacional",
-    "Ocupações",
-    "Divisões ocp.",
-    "Classes de Renda",
-    "Clusters de Renda"
-])
-
-with tab_metodologia:
+def aquecer_cache(base_path, novas, antigas):
+    """
+    Carrega no cache compartilhado os dados dos arquivos que mudaram (novas != antigas),
+    inclusive as séries de todas as visualizações e a figura de variação nula.
+    """
+    if novas["metricas"] != antigas["metricas"]:
+        load_metrics(base_path, novas["metricas"])
+        for _, grupos in abas_grupos.values():
+            for codigo in deflator_suffix.values():
+                load_series_grupos(tuple(grupos), codigo == "D", novas["metricas"])
+
+    if novas["variacao_nula"] != antigas["variacao_nula"]:
+        df_nula = load_data_variacao_nula(base_path, novas["variacao_nula"])
+        if df_nula is not None and not df_nula.empty:
+            render_variacao_nula(df_nula)
+
+    if novas["classes_pareamento"] != antigas["classes_pareamento"]:
+        load_data_classes_pareamento(base_path, novas["classes_pareamento"])
+
+    if novas["grupos_domesticos"] != antigas["grupos_domesticos"]:
+        load_data_grupos_domesticos(base_path, novas["grupos_domesticos"])
+
+    if novas["resumo"] != antigas["resumo"]:
+        load_resumo_metricas(base_path, novas["resumo"])
+
+    if novas["cubo"] != antigas["cubo"]:
+        load_cubo(base_path, novas["cubo"])
+
+@st.cache_resource
+def vigia_dados(base_path):
+    """
+    Inicia (uma vez por processo) a thread que verifica periodicamente os arquivos de dados.
+    Ao detectar mudança, aquece o cache da nova versão e só então a publica para as sessões,
+    que passam a ver os dados atualizados sem reiniciar o app.
+    """
+    estado = versoes_publicadas(base_path)
+
+    def vigiar():
+        while True:
+            time.sleep(INTERVALO_VERIFICACAO)
+            try:
+                novas = ler_versoes(base_path)
+                if novas != estado["versoes"]:
+                    aquecer_cache(base_path, novas, estado["versoes"])
+                    estado["versoes"] = novas
+            except Exception as e:
+                print(f"Erro ao atualizar os dados do app: {e}")
+
+    thread = threading.Thread(target=vigiar, name="vigia_dados", daemon=True)
+    thread.start()
+    return thread
+
+# --- Corpo Principal da Página ---
+
+def render_metodologia():
     #st.header("Metodologia")
 
     st.markdown("""
@@ -392,7 +610,7 @@ with tab_metodologia:
     st.subheader("Distribuição das Classes de Pareamento ao Longo do Tempo")
 
     # --- GRÁFICO 1: Classes de Pareamento ---
-    df_classes_long = load_data_classes_pareamento(arquivo_base)
+    df_classes_long = load_data_classes_pareamento(arquivo_base, versoes["classes_pareamento"])
 
     if df_classes_long is not None and not df_classes_long.empty:
         
@@ -435,7 +653,7 @@ with tab_metodologia:
     # ---GRÁFICO 2: Grupos Domésticos ---
     st.subheader("Proporção de Domicílios com Apenas 1 Grupo Doméstico")
 
-    df_grupos = load_data_grupos_domesticos(arquivo_base)
+    df_grupos = load_data_grupos_domesticos(arquivo_base, versoes["grupos_domesticos"])
 
     if df_grupos is not None and not df_grupos.empty:
         # Filtra os dados com base no slider de ano da sidebar
@@ -493,344 +711,98 @@ with tab_metodologia:
     """)
 
     # Carrega os dados usando a nova função de cache
-    df_nula = load_data_variacao_nula(arquivo_base) # Passa a variável 'arquivo_base'
+    df_nula = load_data_variacao_nula(arquivo_base, versoes["variacao_nula"]) # Passa a variável 'arquivo_base'
 
     # Só executa se os dados foram carregados com sucesso
     if df_nula is not None and not df_nula.empty:
-        
-        plt.style.use('seaborn-v0_8-whitegrid')
-        fig, ax = plt.subplots(figsize = (15, 8))
-
-        ax.plot(df_nula['ano_tri'], df_nula['percentual_zero'], marker = 'o', linestyle = '-', label='Proporção com Variação = 0%')
-        ax.plot(df_nula['ano_tri'], df_nula['percentual_menor_igual_zero'], marker='s', linestyle='--', label='Proporção com Variação <= 0%')
-
-        # add linha em 50%
-        ax.axhline(y=0.5, color='red', linestyle=':', linewidth=1.5, label='Limite de 50% (Mediana = 0)')
-
-        ax.set_title('Proporção de Indivíduos com Variação de Renda Nula ou Negativa', fontsize=16)
-        ax.set_xlabel('Período (Ano-Trimestre)', fontsize=12)
-        ax.set_ylabel('Proporção', fontsize=12)
-
-        ax.yaxis.set_major_formatter(mticker.PercentFormatter(xmax=1.0))
-        
-        ylim_max = 0.6
-        if not df_nula['percentual_menor_igual_zero'].empty:
-            ylim_max = max(df_nula['percentual_menor_igual_zero'].max() * 1.1, 0.6)
-            
-        ax.set_ylim(0, ylim_max)
-        plt.xticks(rotation=45, ha='right')
-        ax.xaxis.set_major_locator(plt.MaxNLocator(20))
-
-        ax.legend(fontsize=11)
-        plt.tight_layout()
-        
-        st.pyplot(fig)
+        # A figura é gerada uma única vez por versão dos dados e reaproveitada como PNG
+        st.image(render_variacao_nula(df_nula), use_container_width=True)
     else:
         st.warning("Não foi possível carregar os dados para o gráfico de variação nula.")
 
-# --- Aba 1: Base (Geral) ---
-with tab_base:
-    st.header("Base")
-    
-    df_base = load_data(grupos_suffix["Base"] + codigo_deflator)
-    
-    # Adiciona uma coluna 'Grupo' para identificar cada DataFrame
-    df_base['Grupo'] = 'Base'
-    
-    # Combina os três DataFrames em um só
-    df_base_combined = pd.concat([df_base])
-    
-    if not df_base_combined.empty:
-        # Chamamos SEM 'group_column' para forçar a lógica de grupo único e cor BASE_COLOR
-        chart = create_combined_chart(df_base_combined)
-        st.altair_chart(chart, use_container_width=True)
 
-# --- Aba 2: Trabalhador de App ---
-with tab_app:
-    st.header("Trabalhador de App")
-    
-    df_base = load_data(grupos_suffix["Base"] + codigo_deflator)
-    df_trab_app = load_data(grupos_suffix["Trabalhador de App"] + codigo_deflator)
-    
-    # Adiciona uma coluna 'Grupo' para identificar cada DataFrame
-    df_base['Grupo'] = 'Base'
-    df_trab_app["Grupo"] = "Trabalhador de App"
-    
-    # Combina os três DataFrames em um só
-    df_trab_app_combined = pd.concat([df_base, df_trab_app])
-    
-    if not df_trab_app_combined.empty:
-        # Chama a mesma função, mas agora passando 'group_column'
-        chart = create_combined_chart(df_trab_app_combined, group_column="Grupo")
-        st.altair_chart(chart, use_container_width=True)
-
-# --- Aba 3: Job Switcher ---
-with tab_switcher:
-    st.header("Job Switcher")
-    
-    df_base = load_data(grupos_suffix["Base"] + codigo_deflator)
-    df_job_switcher = load_data(grupos_suffix["Job Switcher"] + codigo_deflator)
-    
-    # Adiciona uma coluna 'Grupo' para identificar cada DataFrame
-    df_base['Grupo'] = 'Base'
-    df_job_switcher["Grupo"] = "Job Switcher"
-    
-    # Combina os três DataFrames em um só
-    df_job_switcher_combined = pd.concat([df_base, df_job_switcher])
-    
-    if not df_job_switcher_combined.empty:
-        # Chama a mesma função, mas agora passando 'group_column'
-        chart = create_combined_chart(df_job_switcher_combined, group_column="Grupo")
-        st.altair_chart(chart, use_container_width=True)
-
-# --- Aba 4: Comparação por Sexo ---
-with tab_sexo:
-    st.header("Sexo")
-    
-    # Carrega os 3 arquivos de dados necessários
-    df_base = load_data(grupos_suffix["Base"] + codigo_deflator)
-    df_masc = load_data(grupos_suffix["Masculino"] + codigo_deflator)
-    df_fem = load_data(grupos_suffix["Feminino"] + codigo_deflator)
-    
-    # Adiciona uma coluna 'Grupo' para identificar cada DataFrame
-    df_base['Grupo'] = 'Base'
-    df_masc['Grupo'] = 'Masculino'
-    df_fem['Grupo'] = 'Feminino'
-    
-    # Combina os três DataFrames em um só
-    df_sexo_combined = pd.concat([df_base, df_masc, df_fem])
-    
-    if not df_sexo_combined.empty:
-        # Chama a mesma função, mas agora passando 'group_column'
-        chart = create_combined_chart(df_sexo_combined, group_column="Grupo")
-        st.altair_chart(chart, use_container_width=True)
-
-with tab_regioes:
-    st.header("Regiões")
-    
-    df_base = load_data(grupos_suffix['Base'] + codigo_deflator)
-    df_nordeste = load_data(grupos_suffix['Nordeste'] + codigo_deflator)
-    df_sudeste = load_data(grupos_suffix['Sudeste'] + codigo_deflator)
-    df_centro_oeste = load_data(grupos_suffix['Centro-Oeste'] + codigo_deflator)
-    df_norte = load_data(grupos_suffix['Norte'] + codigo_deflator)
-    df_sul = load_data(grupos_suffix['Sul'] + codigo_deflator)
-
-    df_base['Grupo'] = 'Base'
-    df_nordeste['Grupo'] = 'Nordeste'
-    df_sudeste['Grupo'] = 'Sudeste'
-    df_centro_oeste['Grupo'] = 'Centro-Oeste'
-    df_sul['Grupo'] = 'Sul'
-    df_norte['Grupo'] = 'Norte'
-
-    df_regioes_combined = pd.concat([df_base, df_nordeste, df_norte, df_sul, df_sudeste, df_centro_oeste])
-
-    if not df_regioes_combined.empty:
-        # Chama a mesma função, mas agora passando 'group_column'
-        chart = create_combined_chart(df_regioes_combined, group_column="Grupo")
-        st.altair_chart(chart, use_container_width=True)
-
-with tab_carteira:
-    st.header("Carteira Assinada")
-
-    df_base = load_data(grupos_suffix['Base'] + codigo_deflator)
-    df_carteira = load_data(grupos_suffix["Carteira Assinada"] + codigo_deflator)
-
-    df_base['Grupo'] = "Base"
-    df_carteira["Grupo"] = "Carteira Assinada"
-
-    df_carteira_combined = pd.concat([df_base, df_carteira])
-
-    if not df_carteira_combined.empty:
-        # Chama a mesma função, mas agora passando 'group_column'
-        chart = create_combined_chart(df_carteira_combined, group_column="Grupo")
-        st.altair_chart(chart, use_container_width=True)
-
-with tab_quartis:
-    st.header("Quartis")
-    
-    df_base = load_data(grupos_suffix['Base'] + codigo_deflator)
-    df_media = load_data(grupos_suffix["Média"] + codigo_deflator)
-    df_p25 = load_data(grupos_suffix['Percentil 25'] + codigo_deflator)
-    df_p75 = load_data(grupos_suffix['Percentil 75'] + codigo_deflator)
-
-    df_base['Grupo'] = "Base"
-    df_media["Grupo"] = "Média"
-    df_p25['Grupo'] = "Percentil 25"
-    df_p75["Grupo"] = "Percentil 75"
-
-    df_quartis_combined = pd.concat([df_base, df_media, df_p25, df_p75])
-
-    if not df_quartis_combined.empty:
-        # Chama a mesma função, mas agora passando 'group_column'
-        chart = create_combined_chart(df_quartis_combined, group_column="Grupo")
-        st.altair_chart(chart, use_container_width=True)
-
-with tab_idade:
-    st.header("Faixa Etária")
-    
-    df_base = load_data(grupos_suffix['Base'] + codigo_deflator)
-    df_14_24 = load_data(grupos_suffix['14-24 anos'] + codigo_deflator)
-    df_25_54 = load_data(grupos_suffix['25-54 anos'] + codigo_deflator)
-    df_55 = load_data(grupos_suffix['55+ anos'] + codigo_deflator)
-
-    df_base['Grupo'] = "Base"
-    df_14_24['Grupo'] = "14-24"
-    df_25_54['Grupo'] = "25-54"
-    df_55['Grupo'] = "55+"
-
-    df_idade_combined = pd.concat([df_base, df_14_24, df_25_54, df_55])
-
-    if not df_idade_combined.empty:
-        # Chama a mesma função, mas agora passando 'group_column'
-        chart = create_combined_chart(df_idade_combined, group_column="Grupo")
-        st.altair_chart(chart, use_container_width=True)
-
-with tab_rac:
-    st.header("Cor ou Raça")
-    
-    df_base = load_data(grupos_suffix['Base'] + codigo_deflator)
-    df_bra = load_data(grupos_suffix['Branca'] + codigo_deflator)
-    df_pre = load_data(grupos_suffix['Preta'] + codigo_deflator)
-    df_ama = load_data(grupos_suffix['Amarela'] + codigo_deflator)
-    df_par = load_data(grupos_suffix['Parda'] + codigo_deflator)
-    df_ind = load_data(grupos_suffix['Indígena'] + codigo_deflator)
-
-    df_base['Grupo'] = "Base"
-    df_bra['Grupo'] = "Branca"
-    df_pre['Grupo'] = "Preta"
-    df_ama['Grupo'] = "Amarela"
-    df_par['Grupo'] = "Parda"
-    df_ind['Grupo'] = "Indígena"
-    
-    df_raca_combined = pd.concat([df_base, df_bra, df_pre, df_ama, df_par, df_ind])
+def render_grupos(titulo, grupos):
+    """
+    Renderiza a visualização de um conjunto de grupos: o primeiro é sempre a Base.
+    """
+    st.header(titulo)
 
-    if not df_raca_combined.empty:
-        # Chama a mesma função, mas agora passando 'group_column'
-        chart = create_combined_chart(df_raca_combined, group_column="Grupo")
-        st.altair_chart(chart, use_container_width=True)
-        
-with tab_edu:
-    st.header("Nível educacional")
-    
-    df_base = load_data(grupos_suffix["Base"] + codigo_deflator)
-    df_s_inst = load_data(grupos_suffix["Sem instrução"] + codigo_deflator)
-    df_fund_i = load_data(grupos_suffix["Fundamental incompleto"] + codigo_deflator)
-    df_fund_c = load_data(grupos_suffix["Fundamental completo"] + codigo_deflator)
-    df_med_i = load_data(grupos_suffix["Médio incompleto"] + codigo_deflator)
-    df_med_c = load_data(grupos_suffix["Médio completo"] + codigo_deflator)
-    df_sup_i = load_data(grupos_suffix["Superior incompleto"] + codigo_deflator)
-    df_sup_c = load_data(grupos_suffix["Superior completo"] + codigo_deflator)
-    
-    df_base['Grupo'] = "Base"
-    df_s_inst['Grupo'] = "Sem instrução"
-    df_fund_i['Grupo'] = "Fundamental incompleto"
-    df_fund_c['Grupo'] = "Fundamental completo"
-    df_med_i['Grupo'] = "Médio incompleto"
-    df_med_c['Grupo'] = "Médio completo"
-    df_sup_i['Grupo'] = "Superior incompleto"
-    df_sup_c['Grupo'] = "Superior completo"
-    
-    df_educ_combined = pd.concat([df_base, df_s_inst, df_fund_i, df_fund_c, df_med_i, df_med_c, df_sup_i, df_sup_c])
+    grupos = tuple(grupos)
+    deflacionado = codigo_deflator == "D"
 
-    if not df_educ_combined.empty:
-        # Chama a mesma função, mas agora passando 'group_column'
-        chart = create_combined_chart(df_educ_combined, group_column="Grupo")
-        st.altair_chart(chart, use_container_width=True)
-        
-with tab_ocp:
-    st.header("Grupos de ocupações")
-    
-    df_base = load_data(grupos_suffix['Base'] + codigo_deflator)
-    df_dir = load_data(grupos_suffix["Diretores e gerentes"] + codigo_deflator)
-    df_int = load_data(grupos_suffix["Prof. das ciências e intelectuais"] + codigo_deflator)
-    df_med = load_data(grupos_suffix["Prof. de nível médio"] + codigo_deflator)
-    df_adm = load_data(grupos_suffix["Trab. de apoio adm."] + codigo_deflator)
-    df_vend = load_data(grupos_suffix["Trab. de serv. e vend."] + codigo_deflator)
-    df_amb = load_data(grupos_suffix["Trab. ambientais qualificados"] + codigo_deflator)
-    df_urb = load_data(grupos_suffix["Trab. urbanos qualificados"] + codigo_deflator)
-    df_ope = load_data(grupos_suffix["Operadores de máquinas"] + codigo_deflator)
-    df_ele = load_data(grupos_suffix["Ocupações elementares"] + codigo_deflator)
-    df_mil = load_data(grupos_suffix["Militares"] + codigo_deflator)
-
-    df_base['Grupo'] = "Base"
-    df_dir['Grupo'] = "Diretores e gerentes"
-    df_int['Grupo'] = "Prof. das ciências e intelectuais"
-    df_med['Grupo'] = "Prof. de nível médio"
-    df_adm['Grupo'] = "Trab. de apoio adm."
-    df_vend['Grupo'] = "Trab. de serv. e vend."
-    df_amb['Grupo'] = "Trab. ambientais qualificados"
-    df_urb['Grupo'] = "Trab. urbanos qualificados"
-    df_ope['Grupo'] = "Operadores de máquinas"
-    df_ele['Grupo'] = "Ocupações elementares"
-    df_mil['Grupo'] = "Militares"
-    
-    df_ocp_combined = pd.concat([df_base, df_dir, df_int, df_med, df_adm, df_vend, df_amb, df_urb, df_ope, df_ele, df_mil])
+    if load_series_grupos(grupos, deflacionado, versoes["metricas"]).empty:
+        st.error(f"Dados não encontrados para os grupos: {', '.join(grupos)}")
+        return
 
-    if not df_ocp_combined.empty:
-        # Chama a mesma função, mas agora passando 'group_column'
-        chart = create_combined_chart(df_ocp_combined, group_column="Grupo")
-        st.altair_chart(chart, use_container_width=True)
+    spec = chart_spec_grupos(grupos, deflacionado, tuple(year_range), tuple(y_range_values), versoes["metricas"])
 
-with tab_div:
-    st.header("Grupos de ocupações")
-    
-    df_base = load_data(grupos_suffix['Base'] + codigo_deflator)
-    df_com = load_data(grupos_suffix["Comércios"] + codigo_deflator)
-    df_ser = load_data(grupos_suffix["Serviços"] + codigo_deflator)
-    df_ind = load_data(grupos_suffix["Indústrias"] + codigo_deflator)
-    
-    df_base['Grupo'] = "Base"
-    df_com['Grupo'] = "Comércios"
-    df_ser['Grupo'] = "Serviços"
-    df_ind['Grupo'] = "Indústrias"
-    
-    df_div_combined = pd.concat([df_base, df_com, df_ser, df_ind])
+    if spec is None:
+        st.warning("Nao há dados para os filtros selecionados neste periodo.")
+    else:
+        st.vega_lite_chart(spec, use_container_width=True)
 
-    if not df_div_combined.empty:
-        # Chama a mesma função, mas agora passando 'group_column'
-        chart = create_combined_chart(df_div_combined, group_column="Grupo")
-        st.altair_chart(chart, use_container_width=True)
+def render_grupo_personalizado():
+    """
+    Renderiza o grupo personalizado: o usuário combina categorias de várias dimensões
+    (ex.: Feminino × Nordeste × 25-54 anos) e a série é calculada na hora a partir do cubo.
+    """
+    st.header("Grupo personalizado")
 
-with tab_classes:
-    st.header("Classes de Renda")
+    if load_cubo(arquivo_base, versoes["cubo"]) is None:
+        st.warning(f"Cubo de variações não encontrado em {arquivo_base}. Gere-o com variacao_renda.py.")
+        return
 
-    df_base = load_data(grupos_suffix['Base'] + codigo_deflator)
-    df_a = load_data(grupos_suffix["Classe A"] + codigo_deflator)
-    df_b = load_data(grupos_suffix["Classe B"] + codigo_deflator)
-    df_c = load_data(grupos_suffix["Classe C"] + codigo_deflator)
-    df_d = load_data(grupos_suffix["Classe D"] + codigo_deflator)
-    df_e = load_data(grupos_suffix["Classe E"] + codigo_deflator)
+    # Um seletor por dimensão; dimensões sem seleção não filtram
+    filtros = []
+    colunas = st.columns(3)
+    for i, (dimensao, (titulo, rotulos)) in enumerate(dimensoes_cubo.items()):
+        codigos = colunas[i % 3].multiselect(titulo, options=list(rotulos), format_func=rotulos.get)
+        if codigos:
+            filtros.append((dimensao, tuple(sorted(codigos))))
 
-    df_base['Grupo'] = "Base"
-    df_a["Grupo"] = "Classe A"
-    df_b["Grupo"] = "Classe B"
-    df_c["Grupo"] = "Classe C"
-    df_d["Grupo"] = "Classe D"
-    df_e["Grupo"] = "Classe E"
+    if not filtros:
+        st.info("Escolha ao menos uma categoria para montar o grupo.")
+        return
 
-    df_classe_combined = pd.concat([df_base, df_a, df_b, df_c, df_d, df_e])
+    df = serie_personalizada(tuple(filtros), codigo_deflator == "D", versoes["cubo"])
+    spec = create_combined_chart(df, year_range, y_range_values, group_column="Grupo")
 
-    if not df_classe_combined.empty:
-        # Chama a mesma função, mas agora passando 'group_column'
-        chart = create_combined_chart(df_classe_combined, group_column="Grupo")
-        st.altair_chart(chart, use_container_width=True)
+    if spec is None:
+        st.warning("Nao há dados para os filtros selecionados neste periodo.")
+    else:
+        st.vega_lite_chart(spec, use_container_width=True)
 
-with tab_clusters:
-    st.header("Clusters de Renda")
-    df_base = load_data(grupos_suffix['Base'] + codigo_deflator)
-    df_cluster_0 = load_data(grupos_suffix["Cluster 0"] + codigo_deflator)
-    df_cluster_1 = load_data(grupos_suffix["Cluster 1"] + codigo_deflator)
+st.title("Mediana da Variação da Renda")
 
-    df_base['Grupo'] = "Base"
-    df_cluster_0["Grupo"] = "Cluster 0"
-    df_cluster_1['Grupo'] = "Cluster 1"
+fim_carga = time.perf_counter()
 
-    df_cluster_combined = pd.concat([df_base, df_cluster_0, df_cluster_1])
+# Seletor de visualização: ao contrário de st.tabs, apenas a visualização escolhida é calculada a cada interação
+visualizacao = st.radio(
+    "Visualização",
+    options=["Metodologia"] + list(abas_grupos.keys()) + ["Grupo personalizado"],
+    horizontal=True,
+    label_visibility="collapsed",
+)
 
-    if not df_cluster_combined.empty:
-        # Chama a mesma função, mas agora passando 'group_column'
-        chart = create_combined_chart(df_cluster_combined, group_column="Grupo")
-        st.altair_chart(chart, use_container_width=True)
+if visualizacao == "Metodologia":
+    render_metodologia()
+elif visualizacao == "Grupo personalizado":
+    render_grupo_personalizado()
+else:
+    render_grupos(*abas_grupos[visualizacao])
 
 
 st.caption(f"Fonte: PNAD Contínua — Dados de 2012 a {max_yr}")
+
+# Inicia a verificação de mudanças nos dados (no fim do script, com todos os loaders já definidos)
+vigia_dados(arquivo_base)
+
+if PERFIL:
+    fim_render = time.perf_counter()
+    print(
+        f"Tempo de execução ({visualizacao}): "
+        f"imports {fim_imports - inicio_execucao:.3f}s, "
+        f"carga {fim_carga - fim_imports:.3f}s, "
+        f"render {fim_render - fim_carga:.3f}s, "
+        f"total {fim_render - inicio_execucao:.3f}s"
+    )
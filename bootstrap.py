@@ -0,0 +1,57 @@
+import numpy as np
+
+# Parâmetros do bootstrap dos intervalos de confiança
+reamostras_bootstrap = 1000
+nivel_confianca = 0.95
+semente_bootstrap = 2025
+
+# Máximo de elementos (reamostras x observações) sorteados de uma vez: limita a memória a ~32 MB por lote
+elementos_por_lote = 4_000_000
+
+# Quantil correspondente a cada estatística (a média é tratada à parte)
+quantis_estatistica = {"mediana": 0.5, "p25": 0.25, "p75": 0.75}
+
+def estatistica_reamostras(amostras, estatistica):
+    """
+    Calcula a estatística em cada linha da matriz de reamostras (reamostras x n).
+    Os quantis usam np.partition (seleção parcial, sem ordenar a linha inteira),
+    com a mesma interpolação linear de np.percentile.
+    """
+
+    if estatistica == "media":
+        return amostras.mean(axis=1)
+
+    posicao = quantis_estatistica[estatistica] * (amostras.shape[1] - 1)
+    baixo, alto = int(np.floor(posicao)), int(np.ceil(posicao))
+
+    parcial = np.partition(amostras, sorted({baixo, alto}), axis=1)
+    return parcial[:, baixo] + (posicao - baixo) * (parcial[:, alto] - parcial[:, baixo])
+
+def intervalo_bootstrap(valores, estatistica="mediana", rng=None,
+                        reamostras=reamostras_bootstrap, nivel=nivel_confianca):
+    """
+    Intervalo de confiança percentil (inferior, superior) da estatística ("mediana", "media", "p25" ou "p75")
+    por bootstrap. As reamostras são sorteadas em lotes como uma matriz de índices, e a estatística
+    é calculada de uma vez para todo o lote. Retorna (NaN, NaN) com menos de 2 observações.
+    """
+
+    valores = np.asarray(valores, dtype=float)
+    n = len(valores)
+
+    if n < 2:
+        return np.nan, np.nan
+
+    if rng is None:
+        rng = np.random.default_rng(semente_bootstrap)
+
+    lote = max(1, elementos_por_lote // n)
+    resultados = np.empty(reamostras)
+
+    for inicio in range(0, reamostras, lote):
+        fim = min(inicio + lote, reamostras)
+        indices = rng.integers(0, n, size=(fim - inicio, n))
+        resultados[inicio:fim] = estatistica_reamostras(valores[indices], estatistica)
+
+    alfa = (1 - nivel) / 2
+    inferior, superior = np.percentile(resultados, [100 * alfa, 100 * (1 - alfa)])
+    return inferior, superior
@@ -0,0 +1,92 @@
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+from paineis import (pasta_base, assinatura_completa, nome_painel, derivadas_painel, colunas_painel, colunas_filtros,
+                     ler_tabela, ler_arquivo, para_pandas, listar_paineis)
+from agendador import criar_parser, executar_trimestres
+
+# Cache local das colunas mais lidas de cada painel em Arrow IPC sem compressão.
+# O arquivo é aberto com memory map: a leitura não descomprime nem decodifica nada, os buffers
+# apontam direto para o page cache do sistema, e vários processos (workers, notebooks) que leem
+# o mesmo painel compartilham as mesmas páginas em vez de cada um ter a sua cópia decodificada.
+# Cada entrada leva no nome a assinatura do painel e das suas colunas derivadas (assinatura_completa):
+# quando o painel ou um arquivo lateral é reescrito, a entrada antiga deixa de ser usada e é apagada na próxima gravação.
+pasta_cache = pasta_base / "cache"
+
+colunas_cache = [
+    "ID_UNICO", "Ano", "Trimestre", "classe_individuo",
+    "VD4019", "VD4019_deflat", "log_renda", "grupo_renda", "grupo_renda_kmeans",
+    "V2007", "V2009", "V2010", "UF", "VD3004", "V4010", "V4013", "V4029",
+    "plataforma_transporte", "plataforma_entrega", "job_switcher",
+]
+
+def caminho_cache(file, assinatura):
+    """
+    Caminho da entrada do cache do painel 'file' para a versão com 'assinatura'.
+    """
+    return pasta_cache / f"{nome_painel(file)}.{assinatura[:16]}.arrow"
+
+def atualizar_cache(file):
+    """
+    Garante que o cache do painel está em dia com o arquivo e retorna o caminho da entrada.
+    Se o painel mudou, grava uma nova entrada (de forma atômica) e apaga as antigas.
+    """
+
+    derivadas = derivadas_painel(file)
+    caminho = caminho_cache(file, assinatura_completa(file, derivadas))
+    if caminho.exists():
+        return caminho
+
+    colunas = [c for c in colunas_cache if c in colunas_painel(file, derivadas)]
+    tabela = ler_tabela(file, colunas, derivadas=derivadas)
+
+    pasta_cache.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_suffix(f".{os.getpid()}.tmp")
+    with pa.OSFile(str(temporario), "wb") as saida:
+        with pa.ipc.new_file(saida, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+    os.replace(temporario, caminho)
+
+    for antigo in pasta_cache.glob(f"{nome_painel(file)}.*.arrow"):
+        if antigo != caminho:
+            antigo.unlink(missing_ok=True)
+
+    return caminho
+
+def ler_tabela_cache(file, colunas=None, filtros=None):
+    """
+    Lê as colunas do cache como tabela Arrow mapeada em memória (sem cópia).
+    'colunas' e 'filtros' seguem ler_arquivo; o filtro gera uma tabela nova só com as linhas selecionadas.
+    """
+
+    with pa.memory_map(str(atualizar_cache(file))) as mapa:
+        tabela = pa.ipc.open_file(mapa).read_all()
+
+    # Filtra antes de projetar: os filtros podem usar colunas que não foram pedidas
+    if filtros:
+        tabela = tabela.filter(pq.filters_to_expression(filtros))
+    if colunas is not None:
+        tabela = tabela.select(colunas)
+    return tabela
+
+def ler_arquivo_cache(file, colunas=None, filtros=None):
+    """
+    Mesmo que ler_arquivo, mas servido pelo cache quando todas as colunas pedidas (e as usadas
+    nos filtros) estão nele; caso contrário, ou sem 'colunas' (todas), lê o Parquet diretamente.
+    """
+
+    # Sem 'colunas', ler_arquivo retorna todas as colunas do painel, não só as do cache
+    usadas = set(colunas or []) | set(colunas_filtros(filtros))
+    if colunas is None or not usadas <= set(colunas_cache):
+        return ler_arquivo(file, colunas, filtros)
+
+    return para_pandas(ler_tabela_cache(file, colunas, filtros), split_blocks=True)
+
+if __name__ == "__main__":
+    parser = criar_parser("Gera (ou atualiza) o cache Arrow das colunas mais usadas de cada painel.")
+    args = parser.parse_args()
+
+    arquivos = list(listar_paineis().values())
+    print(f"Atualizando o cache de {len(arquivos)} painéis em {pasta_cache}...")
+
+    executar_trimestres(atualizar_cache, [(file,) for file in arquivos], args.workers)
@@ -1,27 +1,47 @@
 from pathlib import Path
 import pandas as pd
+from paineis import caminho_painel, ler_arquivo
+from manifesto import ler_contagem_classes, registrar_contagem_classes
+from agendador import criar_parser, executar_trimestres, listar_trimestres
 
-pasta_base = Path("PNAD_data/Pareamentos")
 pasta_saida = Path("dados_medianas_var")
 
+def contar_classes(file_path):
+    """
+    Retorna o histograma {classe: n} de 'classe_individuo' do painel.
+    Usa o histograma guardado no manifesto quando ele existe e o painel não mudou;
+    caso contrário lê apenas a coluna 'classe_individuo' e guarda o resultado para as próximas vezes.
+    """
+
+    contagem = ler_contagem_classes(file_path)
+    if contagem is not None:
+        return contagem
+
+    # Lê apenas a coluna necessária em vez do painel inteiro
+    df = ler_arquivo(file_path, colunas=["classe_individuo"])
+
+    # conta quantos valores existem de cada tipo
+    contagem = df["classe_individuo"].value_counts().to_dict()
+
+    registrar_contagem_classes(file_path, contagem)
+
+    return {int(classe): int(n) for classe, n in contagem.items()}
+
 def classes_pareamento_individuos(ano, trimestre):
     """
     Conta quantos individuos de cada classe (1 a 5) existem em cada trimestre e em cada ano.
     """
 
-    file_path = pasta_base / f"pessoas_{ano}{trimestre}_{ano+1}{trimestre}_classificado.parquet"
+    file_path = caminho_painel(ano, trimestre)
 
     # caso o arquivo nao exista
     if not file_path.exists():
         print(f"Arquivo não encontrado, pulando: {file_path}")
         return None
 
-    df = pd.read_parquet(file_path)
-
-    # conta quantos valores existem de cada tipo
-    counts = df["classe_individuo"].value_counts()
+    counts = contar_classes(file_path)
 
-    total_individuos = counts.sum()
+    total_individuos = sum(counts.values())
 
     # Previne divisao por zero
     if total_individuos == 0:
@@ -50,32 +70,22 @@ def classes_pareamento_individuos(ano, trimestre):
 
     return row_data
 
-def gerar_contagem_classes(ultimo_ano_disponivel, ultimo_tri_disponivel):
+def gerar_contagem_classes(ultimo_ano_disponivel, ultimo_tri_disponivel, workers=1):
     """
     Função que itera sobre os anos e trimestres
     baseado nos limites dinamicos e gera o CSV final.
+    Com workers > 1 os trimestres são processados em paralelo.
     """
     
-    anos = range(2012, ultimo_ano_disponivel)
-    trimestres = range(1, 5)
+    trimestres = listar_trimestres(ultimo_ano_disponivel - 1, ultimo_tri_disponivel)
 
-    data = []
     print("Iniciando geração de contagem de classes...")
+    print(f"Processando contagem de classes para {len(trimestres)} trimestres")
 
-    for ano in anos:
-        for tri in trimestres:
-            if ano == ultimo_ano_disponivel - 1 and tri > ultimo_tri_disponivel:
-                print(f"Atingido o limite de dados em: {ano}-{tri}")
-                break  
+    resultados = executar_trimestres(classes_pareamento_individuos, trimestres, workers)
 
-            print(f"Processando contagem de classes para: {ano}.{tri}")
-            data_row = classes_pareamento_individuos(ano, tri)
-
-            if data_row:
-                data.append(data_row)
-        
-        if ano == ultimo_ano_disponivel - 1 and tri > ultimo_tri_disponivel:
-            break 
+    # Mantém a ordem dos trimestres e descarta os que falharam ou não existem
+    data = [data_row for _, data_row, _ in resultados if data_row]
 
     if not data:
         print("Nenhum dado processado para contagem de classes.")
@@ -90,3 +100,10 @@ def gerar_contagem_classes(ultimo_ano_disponivel, ultimo_tri_disponivel):
         df_final.to_csv(path_saida, index=False)
         print(f"Arquivo de contagem de classes salvo em: {path_saida}")
 
+if __name__ == "__main__":
+    parser = criar_parser("Gera o CSV com a proporção de indivíduos por classe de pareamento.")
+    parser.add_argument("ultimo_ano", type=int, help="Ano mais recente (T5) com dados completos")
+    parser.add_argument("ultimo_tri", type=int, help="Trimestre mais recente (T5) com dados completos")
+    args = parser.parse_args()
+
+    gerar_contagem_classes(args.ultimo_ano, args.ultimo_tri, args.workers)
\ No newline at end of file
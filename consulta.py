@@ -0,0 +1,158 @@
+from pathlib import Path
+import argparse
+import duckdb
+import pyarrow.parquet as pq
+import pyarrow as pa
+from paineis import pasta_base, listar_paineis, derivadas_painel
+from esquema import esquema_arrow
+from metricas import pasta_dados
+
+# Consultas SQL ad hoc sobre os painéis e as saídas do pipeline, com o DuckDB embutido no processo.
+# As tabelas são apenas views: nada é carregado antes da consulta, e o DuckDB lê só as colunas
+# e os row groups necessários, em paralelo e sem juntar DataFrames no pandas.
+#
+# Views registradas:
+#   paineis  -> todos os painéis classificados, com as colunas derivadas dos arquivos laterais
+#               e as colunas ano_inicio e trimestre_inicio
+#   <nome>   -> cada .parquet e .csv de dados_medianas_var, pelo nome do arquivo sem extensão
+#               (ex.: metricas, estatisticas_variacao, cubo_variacao, contagem_classe_pareamento)
+#   medianas_variacao_renda -> os CSVs por grupo juntos, com a coluna 'sufixo' (ex.: "_4D")
+#
+# Ex.: query("SELECT ano_inicio, classe_individuo, count(*) AS n FROM paineis GROUP BY ALL ORDER BY ALL")
+
+prefixo_csvs_grupos = "medianas_variacao_renda"
+
+# Tipos do SQL das colunas numéricas do esquema (esquema.py), para que painéis ainda com os códigos
+# como texto sejam unidos aos convertidos com os mesmos tipos
+tipos_sql = {pa.int8(): "TINYINT", pa.int16(): "SMALLINT", pa.int32(): "INTEGER", pa.float32(): "FLOAT"}
+
+def literal_sql(texto):
+    """
+    Escreve o texto como literal de string do SQL.
+    """
+    return "'" + str(texto).replace("'", "''") + "'"
+
+def identificador_sql(nome):
+    """
+    Escreve o nome de uma coluna como identificador do SQL (entre aspas duplas).
+    """
+    return '"' + str(nome).replace('"', '""') + '"'
+
+def sql_painel(file, ano, trimestre):
+    """
+    SELECT de um painel com as colunas derivadas juntadas por posição (POSITIONAL JOIN,
+    os arquivos laterais estão alinhados linha a linha com o painel) e as colunas de partição.
+    Colunas derivadas substituem as de mesmo nome gravadas no painel base, e as colunas numéricas
+    do esquema fora do tipo compacto são convertidas. As colunas de partição vêm do período do painel, e não do caminho: o DuckDB detectaria
+    ano_inicio e trimestre_inicio no caminho das partições e as colunas ficariam duplicadas.
+    """
+
+    derivadas = derivadas_painel(file)
+    esquema = pq.read_schema(file)
+    substituidas = [coluna for coluna in derivadas if coluna in esquema.names]
+    convertidas = [f"CAST(base.{identificador_sql(campo.name)} AS {tipos_sql[esquema_arrow[campo.name]]}) "
+                   f"AS {identificador_sql(campo.name)}"
+                   for campo in esquema
+                   if campo.name not in substituidas and esquema_arrow.get(campo.name) in tipos_sql
+                   and campo.type != esquema_arrow[campo.name]]
+
+    selecao = "base.*"
+    if substituidas:
+        selecao += f" EXCLUDE ({', '.join(identificador_sql(c) for c in substituidas)})"
+    if convertidas:
+        selecao += f" REPLACE ({', '.join(convertidas)})"
+    juncoes = ""
+
+    for i, (coluna, caminho) in enumerate(derivadas.items()):
+        selecao += f", d{i}.{identificador_sql(coluna)}"
+        juncoes += f" POSITIONAL JOIN read_parquet({literal_sql(caminho)}) AS d{i}"
+
+    return (f"SELECT {selecao}, {int(ano)}::SMALLINT AS ano_inicio, {int(trimestre)}::TINYINT AS trimestre_inicio "
+            f"FROM read_parquet({literal_sql(file)}, hive_partitioning = false) AS base{juncoes}")
+
+def conectar(pasta_paineis=pasta_base, pasta_saidas=pasta_dados, threads=None, memoria=None):
+    """
+    Abre uma conexão DuckDB em memória com as views dos painéis e das saídas do pipeline.
+    'threads' limita o paralelismo (padrão: todos os núcleos) e 'memoria' (ex.: "4GB") limita a memória;
+    acima do limite, agregações e ordenações grandes usam disco em vez de falhar.
+    As views refletem os arquivos existentes no momento da conexão.
+    """
+
+    conexao = duckdb.connect()
+
+    if threads is not None:
+        conexao.execute(f"SET threads = {int(threads)}")
+    if memoria is not None:
+        conexao.execute(f"SET memory_limit = {literal_sql(memoria)}")
+
+    paineis = listar_paineis(pasta_paineis)
+    if paineis:
+        # Painéis com colunas diferentes são unidos pelo nome; colunas ausentes em um painel vêm nulas
+        selects = [sql_painel(file, ano, trimestre) for (ano, trimestre), file in paineis.items()]
+        conexao.execute("CREATE OR REPLACE VIEW paineis AS " + " UNION ALL BY NAME ".join(selects))
+    else:
+        print(f"Nenhum painel encontrado em {pasta_paineis}; a view 'paineis' não foi criada.")
+
+    leitores = {".parquet": "read_parquet", ".csv": "read_csv_auto"}
+    for file in sorted(Path(pasta_saidas).glob("*")):
+        if file.suffix in leitores and not file.name.startswith(prefixo_csvs_grupos):
+            conexao.execute(
+                f'CREATE OR REPLACE VIEW "{file.stem}" AS SELECT * FROM {leitores[file.suffix]}({literal_sql(file)})'
+            )
+
+    # Uma única view para os CSVs por grupo, em vez de uma por arquivo
+    if any(Path(pasta_saidas).glob(f"{prefixo_csvs_grupos}*.csv")):
+        padrao = literal_sql(Path(pasta_saidas) / f"{prefixo_csvs_grupos}*.csv")
+        conexao.execute(f"""
+            CREATE OR REPLACE VIEW medianas_variacao_renda AS
+            SELECT regexp_extract(filename, '{prefixo_csvs_grupos}(_[^.]*)\\.csv$', 1) AS sufixo, * EXCLUDE (filename)
+            FROM read_csv_auto({padrao}, filename = true, union_by_name = true)
+        """)
+
+    return conexao
+
+def query(sql, conexao=None):
+    """
+    Executa a consulta e retorna o resultado como DataFrame.
+    Sem 'conexao', abre uma nova (com os arquivos atuais); para várias consultas seguidas,
+    reutilize a de conectar().
+    """
+
+    if conexao is None:
+        conexao = conectar()
+    return conexao.sql(sql).df()
+
+def listar_tabelas(conexao):
+    """
+    Lista as views disponíveis e o número de colunas de cada uma.
+    """
+    return conexao.sql("""
+        SELECT table_name AS tabela, count(*) AS colunas
+        FROM information_schema.columns
+        GROUP BY table_name
+        ORDER BY table_name
+    """).df()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa uma consulta SQL sobre os painéis e as saídas do pipeline.")
+    parser.add_argument("sql", nargs="?", help="Consulta SQL (ex.: \"SELECT count(*) FROM paineis\")")
+    parser.add_argument("--saida", help="Grava o resultado em .csv ou .parquet em vez de imprimir")
+    parser.add_argument("--tabelas", action="store_true", help="Lista as tabelas disponíveis")
+    parser.add_argument("--threads", type=int, help="Número de threads do DuckDB (padrão: todos os núcleos)")
+    parser.add_argument("--memoria", help="Limite de memória do DuckDB, ex.: 4GB (acima dele usa disco)")
+    args = parser.parse_args()
+
+    conexao = conectar(threads=args.threads, memoria=args.memoria)
+
+    if args.tabelas or not args.sql:
+        print(listar_tabelas(conexao).to_string(index=False))
+    elif args.saida:
+        # O resultado vai direto para o arquivo, sem passar pelo pandas
+        relacao = conexao.sql(args.sql)
+        if args.saida.endswith(".parquet"):
+            relacao.write_parquet(args.saida)
+        else:
+            relacao.write_csv(args.saida)
+        print(f"Resultado salvo em: {args.saida}")
+    else:
+        print(conexao.sql(args.sql).df().to_string(index=False))
@@ -0,0 +1,129 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from grupos import grupos_suffix
+
+# Cubo de variações: uma linha por indivíduo pareado e trimestre, apenas com a variação de renda
+# (com e sem deflator, float32) e as dimensões codificadas em int8. Com ele, a mediana de qualquer
+# combinação de filtros (ex.: Feminino x Nordeste x 25-54 anos) é calculada na hora, sem reler os painéis.
+# O código -1 indica valor ausente, fora das categorias ou diferente entre a primeira e a quinta entrevista
+# (como nos grupos de variacao_renda.py, o indivíduo só pertence a uma categoria se as duas entrevistas pertencem).
+# Para IDs com mais de uma linha no trimestre, cada dimensão guarda um único código comum às duas entrevistas,
+# então os totais de alguns grupos podem diferir levemente dos calculados por variacao_renda.py.
+
+nome_arquivo_cubo = "cubo_variacao.parquet"
+
+def rotulos_sufixos(prefixo, posicao):
+    """
+    Rótulos de uma dimensão a partir de grupos_suffix: {código: nome} dos grupos cujo sufixo
+    começa com 'prefixo', usando como código o caractere do sufixo na 'posicao'.
+    """
+    return {int(sufixo[posicao]): grupo for grupo, sufixo in grupos_suffix.items()
+            if sufixo.startswith(prefixo) and len(sufixo) == posicao + 1}
+
+siglas_uf = {
+    11: "RO", 12: "AC", 13: "AM", 14: "RR", 15: "PA", 16: "AP", 17: "TO",
+    21: "MA", 22: "PI", 23: "CE", 24: "RN", 25: "PB", 26: "PE", 27: "AL", 28: "SE", 29: "BA",
+    31: "MG", 32: "ES", 33: "RJ", 35: "SP",
+    41: "PR", 42: "SC", 43: "RS",
+    50: "MS", 51: "MT", 52: "GO", 53: "DF",
+}
+
+# Dimensões do cubo: coluna -> (título, {código: rótulo}), na ordem exibida no app
+dimensoes_cubo = {
+    "sexo": ("Sexo", {1: "Masculino", 2: "Feminino"}),
+    "regiao": ("Região", {1: "Norte", 2: "Nordeste", 3: "Sudeste", 4: "Sul", 5: "Centro-Oeste"}),
+    "uf": ("UF", siglas_uf),
+    "faixa_idade": ("Faixa etária", {1: "14-24 anos", 2: "25-54 anos", 3: "55+ anos"}),
+    "cor": ("Cor ou raça", rotulos_sufixos("_17", 3)),
+    "educacao": ("Nível educacional", rotulos_sufixos("_18", 3)),
+    "ocupacao": ("Grupo de ocupação", dict(sorted(rotulos_sufixos("_19", 3).items()))),
+    "divisao": ("Divisão de ocupação", rotulos_sufixos("_20", 3)),
+    "carteira": ("Carteira assinada", {1: "Com carteira", 2: "Sem carteira"}),
+    "app": ("Trabalhador de App", {1: "Sim", 0: "Não"}),
+}
+
+def tabela_cubo(codigos, variacoes, ano_final, trimestre):
+    """
+    Monta as linhas do cubo de um trimestre a partir das dimensões ({coluna: array int8})
+    e das variações ({"variacao": array, "variacao_deflat": array}). Dimensões ausentes ficam com -1.
+    """
+
+    n = len(next(iter(variacoes.values())))
+    return pd.DataFrame({
+        "ano_final": np.full(n, ano_final, dtype=np.int16),
+        "trimestre": np.full(n, trimestre, dtype=np.int8),
+        **{coluna: np.asarray(valores, dtype=np.float32) for coluna, valores in variacoes.items()},
+        **{dimensao: np.asarray(codigos.get(dimensao, np.full(n, -1)), dtype=np.int8) for dimensao in dimensoes_cubo},
+    })
+
+def carregar_cubo(pasta=Path("dados_medianas_var")):
+    """
+    Lê o cubo gravado por variacao_renda.py, ordenado por trimestre, como arrays numpy
+    ({"colunas": {coluna: array}, "trimestres": DataFrame com ano_final, trimestre, inicio, fim}),
+    para que as consultas sejam apenas máscaras e fatias, sem group-by.
+    """
+
+    tabela = pd.read_parquet(Path(pasta) / nome_arquivo_cubo)
+    tabela = tabela.sort_values(["ano_final", "trimestre"], kind="stable", ignore_index=True)
+
+    colunas = {coluna: tabela[coluna].to_numpy() for coluna in tabela.columns}
+
+    # Fatia [inicio, fim) de cada trimestre
+    chaves = colunas["ano_final"].astype(np.int32) * 10 + colunas["trimestre"]
+    inicios = np.flatnonzero(np.r_[True, chaves[1:] != chaves[:-1]])
+    fins = np.r_[inicios[1:], len(chaves)]
+
+    trimestres = pd.DataFrame({
+        "ano_final": colunas["ano_final"][inicios],
+        "trimestre": colunas["trimestre"][inicios],
+        "inicio": inicios,
+        "fim": fins,
+    })
+    return {"colunas": colunas, "trimestres": trimestres}
+
+def mascara_filtros(cubo, filtros):
+    """
+    Máscara das linhas do cubo que atendem a todos os filtros ({dimensao: códigos aceitos};
+    listas vazias não filtram). Cada filtro é uma tabela de 256 posições indexada pelo próprio código int8,
+    o que evita comparar a coluna com cada código aceito.
+    """
+
+    n = len(cubo["colunas"]["ano_final"])
+    mascara = np.ones(n, dtype=bool)
+
+    for dimensao, codigos in filtros.items():
+        if not codigos:
+            continue
+        aceitos = np.zeros(256, dtype=bool)
+        aceitos[np.asarray(list(codigos), dtype=np.int8).view(np.uint8)] = True
+        mascara &= aceitos[cubo["colunas"][dimensao].view(np.uint8)]
+
+    return mascara
+
+def consultar_cubo(cubo, filtros, deflacionado=True):
+    """
+    Mediana da variação de renda e número de observações, por trimestre, dos indivíduos que atendem
+    aos filtros (ex.: {"sexo": [2], "regiao": [2], "faixa_idade": [2]}).
+    Retorna um DataFrame com ano_final, trimestre, mediana_variacao e obs, como serie_grupo.
+    """
+
+    variacao = cubo["colunas"]["variacao_deflat" if deflacionado else "variacao"]
+    selecionados = mascara_filtros(cubo, filtros) & np.isfinite(variacao)
+
+    trimestres = cubo["trimestres"]
+    medianas = np.full(len(trimestres), np.nan)
+    obs = np.zeros(len(trimestres), dtype=np.int32)
+
+    for i, (inicio, fim) in enumerate(zip(trimestres["inicio"], trimestres["fim"])):
+        valores = variacao[inicio:fim][selecionados[inicio:fim]]
+        obs[i] = len(valores)
+        if len(valores):
+            medianas[i] = np.median(valores)
+
+    return pd.DataFrame({
+        "ano_final": trimestres["ano_final"],
+        "trimestre": trimestres["trimestre"],
+        "mediana_variacao": medianas,
+        "obs": obs,
+    })[obs > 0].reset_index(drop=True)
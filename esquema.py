@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Tipos compactos das colunas dos painéis classificados, aplicados por escrever_painel (paineis.py).
+# Os painéis chegam do R com os códigos da PNAD como texto e as colunas derivadas em float64;
+# com inteiros pequenos (nullable, para manter os ausentes), categorias e float32 cada painel
+# ocupa bem menos memória no pandas, o que limita quantos trimestres cabem juntos na RAM.
+# Colunas fora do esquema (IDs, rendas, pesos) ficam como estão.
+
+codigos_int8 = [
+    "Trimestre", "UF", "V1008", "V1014", "V1022", "V1023", "V2003", "V2005", "V2007", "V2008", "V20081",
+    "V2010", "VD3004", "V4012", "V4029", "V4040", "V4043", "VD4001", "VD4002", "VD4009",
+    "VD4001_lag", "VD4009_lag", "V4040_lag", "classe_individuo", "n_grupos",
+    "plataforma_transporte", "plataforma_entrega", "job_switch_event", "job_switcher", "carteira_assinada",
+    "grupo_renda_kmeans",
+]
+codigos_int16 = ["Ano", "V20082", "V2009", "V4010", "V4041", "V4010_lag", "ano_nascimento", "idade_corrigida"]
+# Códigos CNAE têm 5 dígitos e não cabem em int16; individuo_id é um contador do painel
+codigos_int32 = ["V4013", "V4013_lag", "individuo_id"]
+
+# Mesma ordem das categorias de rotular_faixas (fixo_cluster_renda.py)
+categorias_grupo_renda = ["E", "D", "C", "B", "A"]
+
+# Coluna -> tipo pandas
+esquema_painel = {
+    **{coluna: "Int8" for coluna in codigos_int8},
+    **{coluna: "Int16" for coluna in codigos_int16},
+    **{coluna: "Int32" for coluna in codigos_int32},
+    "grupo_renda": pd.CategoricalDtype(categorias_grupo_renda),
+    "periodo": "category",
+    "tipo_grupo": "category",
+    "log_renda": "float32",
+}
+
+def tipo_arrow(tipo):
+    """
+    Tipo Arrow correspondente a um tipo do esquema (como o pandas grava a coluna no Parquet).
+    """
+
+    if isinstance(tipo, pd.CategoricalDtype) or tipo == "category":
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.from_numpy_dtype(np.dtype(str(tipo).lower()))
+
+# Coluna -> tipo Arrow, usado para ler juntos painéis convertidos e painéis ainda no formato do R
+esquema_arrow = {coluna: tipo_arrow(tipo) for coluna, tipo in esquema_painel.items()}
+
+def converter_coluna(serie, tipo):
+    """
+    Converte a coluna para 'tipo' sem perder informação. Retorna None se a conversão perderia valores
+    (texto não numérico, números com casas decimais ou fora do intervalo do inteiro, categorias desconhecidas).
+    O float32 é a exceção: a perda de precisão é aceita (usado só em log_renda).
+    """
+
+    if tipo == "float32":
+        return pd.to_numeric(serie, errors="coerce").astype("float32")
+
+    if isinstance(tipo, pd.CategoricalDtype) or tipo == "category":
+        categorias = getattr(tipo, "categories", None)
+        if categorias is not None and not serie.dropna().isin(categorias).all():
+            return None
+        return serie.astype(tipo)
+
+    numerica = pd.to_numeric(serie, errors="coerce")
+    valores = numerica.dropna().to_numpy(dtype=float)
+    limites = np.iinfo(tipo.lower())
+
+    if (numerica.notna() != serie.notna()).any():
+        return None
+    if len(valores) and ((valores % 1 != 0).any() or valores.min() < limites.min or valores.max() > limites.max):
+        return None
+
+    return numerica.astype(tipo)
+
+def aplicar_esquema(dados, avisar=True, colunas=None):
+    """
+    Retorna o df com as colunas do esquema convertidas para os tipos compactos.
+    Com 'colunas', converte apenas as colunas da lista.
+    Colunas cujos valores não cabem no tipo do esquema são mantidas como estão (com um aviso).
+    """
+
+    convertidas = {}
+
+    for coluna, tipo in esquema_painel.items():
+        if coluna not in dados or dados[coluna].dtype == tipo or (colunas is not None and coluna not in colunas):
+            continue
+
+        serie = converter_coluna(dados[coluna], tipo)
+        if serie is None:
+            if avisar:
+                print(f"  AVISO: coluna '{coluna}' mantida como {dados[coluna].dtype}: valores fora do tipo {tipo}")
+            continue
+        convertidas[coluna] = serie
+
+    return dados.assign(**convertidas) if convertidas else dados
+
+def colunas_fora_do_esquema(dados):
+    """
+    Lista as colunas do esquema presentes no df que ainda não estão no tipo compacto.
+    """
+    return [coluna for coluna, tipo in esquema_painel.items() if coluna in dados and dados[coluna].dtype != tipo]
+
+if __name__ == "__main__":
+    from paineis import listar_paineis, converter_painel
+    from agendador import criar_parser, executar_trimestres
+
+    parser = criar_parser("Valida os tipos dos painéis classificados e converte os que estão fora do esquema.")
+    args = parser.parse_args()
+
+    arquivos = list(listar_paineis().values())
+    print(f"Encontrados {len(arquivos)} painéis para validar...")
+
+    executar_trimestres(converter_painel, [(file,) for file in arquivos], args.workers)
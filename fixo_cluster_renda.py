@@ -1,9 +1,8 @@
-from pathlib import Path
 import pandas as pd
 import numpy as np
-import bisect
-
-pasta_base = Path("PNAD_data/Pareamentos")
+from paineis import pasta_base, caminho_painel, ler_arquivo, escrever_derivadas
+from agendador import criar_parser, executar_trimestres, listar_trimestres
+from manifesto import hash_entradas, precisa_atualizar, registrar_transformacoes
 
 salarios_minimos = {"2012" : 622,
       "2013" : 678,
@@ -25,49 +24,91 @@ salarios_minimos = {"2012" : 622,
 classes_rotulo = {5 : "A", 4: "B", 3 : "C", 2 : "D", 1 : "E"}
 classes = [0, 1, 3, 5, 15]
 
-def faixas(ano, trimestre):
-           
-    file = pasta_base / f"pessoas_{ano}{trimestre}_{ano+1}{trimestre}_classificado.parquet"
+# Incrementar sempre que a forma de calcular a coluna mudar
+versao_faixas = "1"
+
+# Rótulos na ordem das posições 1 a 5 retornadas pela busca binária em 'classes'
+categorias_rotulo = [classes_rotulo[posi] for posi in range(1, len(classes) + 1)]
+
+def salario_minimo(ano, trimestre):
+    """
+    Retorna o salário mínimo usado para o painel que começa em {ano}.{trimestre}.
+    """
 
-    dados = pd.read_parquet(file)
-    
     if ano == 2023 and trimestre == 1:
-        salario_min = salarios_minimos.get("2023_1")
-    else:
-        salario_min = salarios_minimos.get(str(ano))
-        
-    def classe(renda):
-        
-        prop = renda/salario_min
-        posi = bisect.bisect_left(classes, prop)
-        cla = classes_rotulo.get(posi)
-        
-        return cla
-
-    validos = dados["VD4019"].notna()
-    rendas = dados.loc[validos, "VD4019"].values.reshape(-1, 1)
-
-    labels = [classe(r) for r in rendas]
-    
-    dados["grupo_renda"] = pd.Series(dtype="object")
+        return salarios_minimos.get("2023_1")
+    return salarios_minimos.get(str(ano))
+
+def salarios_por_linha(anos, trimestres):
+    """
+    Retorna um vetor com o salário mínimo de cada linha, para dfs com vários anos misturados.
+    """
+
+    anos = np.asarray(anos, dtype=int)
+    trimestres = np.asarray(trimestres, dtype=int)
+
+    anuais = {int(a): valor for a, valor in salarios_minimos.items() if a.isdigit()}
+    salarios = pd.Series(anos).map(anuais).to_numpy(dtype=float, copy=True)
+
+    # Caso especial: o reajuste de 2023 só entrou em vigor a partir do 2º trimestre
+    salarios[(anos == 2023) & (trimestres == 1)] = salarios_minimos.get("2023_1")
+
+    return salarios
+
+def rotular_faixas(rendas, salario_min):
+    """
+    Classifica as rendas nas faixas A a E de uma só vez.
+    'salario_min' pode ser um escalar ou um vetor com um valor por linha.
+    Retorna um pd.Categorical (NaN para rendas ausentes ou não positivas).
+    """
+
+    rendas = np.asarray(rendas, dtype=float)
+    prop = rendas / np.asarray(salario_min, dtype=float)
 
-    dados.loc[validos, "grupo_renda"] = labels
+    # Mesmo critério do bisect.bisect_left, aplicado ao vetor inteiro
+    posi = np.searchsorted(classes, prop, side="left")
+
+    # posição 0 (renda <= 0) não tem rótulo, assim como rendas ausentes
+    codigos = posi - 1
+    codigos[np.isnan(prop)] = -1
+
+    return pd.Categorical.from_codes(codigos, categories=categorias_rotulo)
+
+def calcular_faixas(dados, ano, trimestre):
+    """
+    Adiciona a coluna 'grupo_renda' (classes A a E em salários mínimos) ao df do painel {ano}.{trimestre}.
+    """
+
+    dados["grupo_renda"] = rotular_faixas(dados["VD4019"], salario_minimo(ano, trimestre))
+
+    return dados
+
+def faixas(ano, trimestre, forcar=False):
+           
+    file = caminho_painel(ano, trimestre)
+
+    hash_atual = hash_entradas(file)
+    versoes = {"grupo_renda": versao_faixas}
+
+    if not forcar and not precisa_atualizar(file, versoes, hash_atual):
+        print(f"{ano}.{trimestre} já está atualizado. Pulando.")
+        return
+
+    dados = ler_arquivo(file, colunas=["VD4019"])
+
+    dados = calcular_faixas(dados, ano, trimestre)
     
     contagem = dados["grupo_renda"].value_counts(dropna=False).sort_index()
 
     print("\nContagem de linhas por grupo de renda:")
     print(contagem)
     
-    dados.to_parquet(file)
+    escrever_derivadas(dados[["grupo_renda"]], file)
+    registrar_transformacoes(file, versoes, hash_atual)
 
 if __name__ == "__main__":
-    anos = range(2012, 2025)
-    tri = range(1, 5)
-
-    for ano in anos:
-        for trimestre in tri:
-            if ano == 2024 and trimestre == 3:
-                break
-            
-            faixas(ano, trimestre)
-        
\ No newline at end of file
+    parser = criar_parser("Classifica a renda de cada painel em faixas de salário mínimo.", incremental=True)
+    args = parser.parse_args()
+
+    tarefas = [(ano, trimestre, args.forcar) for ano, trimestre in listar_trimestres(2024, 2)]
+    executar_trimestres(faixas, tarefas, args.workers)
\ No newline at end of file
@@ -0,0 +1,88 @@
+# Mapeia os nomes das abas/grupos para os sufixos dos arquivos
+grupos_suffix = {
+    "Base": "_0",
+    "Trabalhador de App": "_1",
+    "Job Switcher": "_2",
+    "Masculino": "_3",
+    "Feminino": "_4",
+    "Norte": '_5',
+    "Nordeste": '_6',
+    "Sudeste": '_7',
+    'Sul': '_8',
+    'Centro-Oeste': '_9',
+    "Carteira Assinada": "_10",
+    "Média": "_11",
+    "Percentil 25": "_12",
+    "Percentil 75": "_13",
+    "14-24 anos": "_14",
+    "25-54 anos": "_15",
+    "55+ anos": "_16",
+    "Branca": "_171",
+    "Preta": "_172",
+    "Amarela": "_173",
+    "Parda": "_174",
+    "Indígena": "_175",
+    "Sem instrução": "_181",
+    "Fundamental incompleto": "_182",
+    "Fundamental completo": "_183",
+    "Médio incompleto": "_184",
+    "Médio completo": "_185",
+    "Superior incompleto": "_186",
+    "Superior completo": "_187",
+    "Diretores e gerentes":"_191",
+    "Prof. das ciências e intelectuais":"_192",
+    "Prof. de nível médio":"_193",
+    "Trab. de apoio adm.":"_194",
+    "Trab. de serv. e vend.":"_195",
+    "Trab. ambientais qualificados":"_196",
+    "Trab. urbanos qualificados":"_197",
+    "Operadores de máquinas":"_198",
+    "Ocupações elementares":"_199",
+    "Militares":"_190",
+    "Comércios": "_201",
+    "Serviços": "_202",
+    "Indústrias": "_203",
+    "Classe A": "_21A",
+    "Classe B": "_21B",
+    "Classe C": "_21C",
+    "Classe D": "_21D",
+    "Classe E": "_21E",
+    "Cluster 0": "_22_0",
+    "Cluster 1": "_22_1"
+}
+
+# Mapeia a opção do deflator para o sufixo
+deflator_suffix = {
+    "Sim": "D",
+    "Não": ""
+}
+
+# Visualizações do app: nome -> (título, grupos exibidos juntos, na ordem de exibição)
+abas_grupos = {
+    "Base": ("Base", ["Base"]),
+    "Trabalhador de App": ("Trabalhador de App", ["Base", "Trabalhador de App"]),
+    "Job Switcher": ("Job Switcher", ["Base", "Job Switcher"]),
+    "Sexo": ("Sexo", ["Base", "Masculino", "Feminino"]),
+    "Regiões": ("Regiões", ["Base", "Nordeste", "Norte", "Sul", "Sudeste", "Centro-Oeste"]),
+    "Carteira Assinada": ("Carteira Assinada", ["Base", "Carteira Assinada"]),
+    "Quartis": ("Quartis", ["Base", "Média", "Percentil 25", "Percentil 75"]),
+    "Faixa Etária": ("Faixa Etária", ["Base", "14-24 anos", "25-54 anos", "55+ anos"]),
+    "Cor ou raça": ("Cor ou Raça", ["Base", "Branca", "Preta", "Amarela", "Parda", "Indígena"]),
+    "Nível educacional": ("Nível educacional", ["Base", "Sem instrução", "Fundamental incompleto",
+                                                "Fundamental completo", "Médio incompleto", "Médio completo",
+                                                "Superior incompleto", "Superior completo"]),
+    "Ocupações": ("Grupos de ocupações", ["Base", "Diretores e gerentes", "Prof. das ciências e intelectuais",
+                                          "Prof. de nível médio", "Trab. de apoio adm.", "Trab. de serv. e vend.",
+                                          "Trab. ambientais qualificados", "Trab. urbanos qualificados",
+                                          "Operadores de máquinas", "Ocupações elementares", "Militares"]),
+    "Divisões ocp.": ("Grupos de ocupações", ["Base", "Comércios", "Serviços", "Indústrias"]),
+    "Classes de Renda": ("Classes de Renda", ["Base", "Classe A", "Classe B", "Classe C", "Classe D", "Classe E"]),
+    "Clusters de Renda": ("Clusters de Renda", ["Base", "Cluster 0", "Cluster 1"]),
+}
+
+# Rótulos exibidos na legenda quando diferentes do nome do grupo
+rotulos_grupos = {
+    "14-24 anos": "14-24",
+    "25-54 anos": "25-54",
+    "55+ anos": "55+",
+}
@@ -1,48 +1,273 @@
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, kmeans_plusplus
 from sklearn.metrics import silhouette_score
-from pathlib import Path
+import hashlib
 import pandas as pd
 import numpy as np
+from paineis import pasta_base, caminho_painel, ler_arquivo, ler_paineis, escrever_derivadas
+from cache_paineis import ler_arquivo_cache
+from agendador import criar_parser, executar_trimestres, listar_trimestres
+from manifesto import hash_entradas, precisa_atualizar, registrar_transformacoes, ler_resultado, registrar_resultado, versao_registrada
 
-pasta_base = Path("PNAD_data/Pareamentos")
+# Incrementar sempre que a forma de calcular a coluna mudar
+versao_kmeans = "2"
 
-def otimizar_clusters(X, k_min=2, k_max=10, random_state=42, plot=True):
+def histograma_1d(valores):
+    """
+    Colapsa um vetor 1-D em (valores únicos ordenados, contagem de cada valor, índice do único de cada elemento).
+    """
+
+    unicos, inverso, contagens = np.unique(np.asarray(valores, dtype=float).ravel(),
+                                           return_inverse=True, return_counts=True)
+    return unicos, contagens, inverso
+
+def kmeans_1d_exato(valores, k, pesos=None):
+    """
+    k-means ótimo para dados 1-D, por programação dinâmica sobre os valores ordenados.
+    Em 1-D cada cluster ótimo é um intervalo contíguo, então basta escolher onde cortar o vetor ordenado.
+    'pesos' permite passar valores únicos com suas contagens (ver histograma_1d).
+    Retorna (centros ordenados, labels de cada valor de entrada).
+    """
+
+    valores = np.asarray(valores, dtype=float).ravel()
+    if pesos is None:
+        unicos, pesos, inverso = histograma_1d(valores)
+    else:
+        ordem = np.argsort(valores)
+        unicos, pesos = valores[ordem], np.asarray(pesos, dtype=float)[ordem]
+        inverso = np.empty_like(ordem)
+        inverso[ordem] = np.arange(len(ordem))
+
+    n = len(unicos)
+    k = min(k, n)
+
+    # Somas acumuladas para obter o custo (soma dos quadrados intra-cluster) de qualquer intervalo em O(1)
+    W = np.concatenate([[0.0], np.cumsum(pesos)])
+    S = np.concatenate([[0.0], np.cumsum(pesos * unicos)])
+    Q = np.concatenate([[0.0], np.cumsum(pesos * unicos ** 2)])
+
+    def custo(inicio, fim):
+        # custo do intervalo unicos[inicio:fim + 1]; aceita vetores em 'inicio'
+        w = W[fim + 1] - W[inicio]
+        s = S[fim + 1] - S[inicio]
+        return (Q[fim + 1] - Q[inicio]) - s ** 2 / w
+
+    # D[m, i]: menor custo para agrupar unicos[0:i + 1] em m + 1 clusters
+    # B[m, i]: início do último cluster nessa solução
+    D = np.full((k, n), np.inf)
+    B = np.zeros((k, n), dtype=int)
+    D[0] = custo(np.zeros(n, dtype=int), np.arange(n))
+
+    for m in range(1, k):
+        # Divisão e conquista: o melhor ponto de corte é monotônico em i
+        pilha = [(m, n - 1, m, n - 1)]
+        while pilha:
+            i_ini, i_fim, j_ini, j_fim = pilha.pop()
+            if i_ini > i_fim:
+                continue
+            i = (i_ini + i_fim) // 2
+            candidatos = np.arange(j_ini, min(j_fim, i) + 1)
+            custos = D[m - 1, candidatos - 1] + custo(candidatos, i)
+            melhor = int(np.argmin(custos))
+            D[m, i] = custos[melhor]
+            B[m, i] = candidatos[melhor]
+            pilha.append((i_ini, i - 1, j_ini, candidatos[melhor]))
+            pilha.append((i + 1, i_fim, candidatos[melhor], j_fim))
+
+    # Reconstrói os cortes a partir do fim
+    labels_unicos = np.zeros(n, dtype=int)
+    centros = np.zeros(k)
+    fim = n - 1
+    for m in range(k - 1, -1, -1):
+        inicio = B[m, fim] if m > 0 else 0
+        labels_unicos[inicio:fim + 1] = m
+        centros[m] = (S[fim + 1] - S[inicio]) / (W[fim + 1] - W[inicio])
+        fim = inicio - 1
+
+    return centros, labels_unicos[inverso]
+
+def pontuar_clusters(X, k_min=2, k_max=10, random_state=42, metodo="kmeans", tamanho_amostra=5000):
+    """
+    Calcula o silhouette de cada k entre k_min e k_max.
+    metodo="kmeans" usa o KMeans do sklearn; metodo="exato" usa o k-means 1-D ótimo (kmeans_1d_exato).
+    O silhouette é O(n²), por isso é calculado sobre uma amostra de 'tamanho_amostra' pontos
+    sorteada com semente fixa (None usa todos os pontos).
+    """
+
+    X = np.asarray(X, dtype=float).reshape(-1, 1)
+    if tamanho_amostra is not None and tamanho_amostra >= len(X):
+        tamanho_amostra = None
+
+    if metodo == "exato":
+        unicos, contagens, inverso = histograma_1d(X)
 
     scores = {}
     for k in range(k_min, k_max+1):
-        kmeans = KMeans(n_clusters=k, random_state=random_state, n_init='auto')
-        labels = kmeans.fit_predict(X)
-        
-        score = silhouette_score(X, labels)
-        scores[k] = score
+        if metodo == "exato":
+            _, labels_unicos = kmeans_1d_exato(unicos, k, pesos=contagens)
+            labels = labels_unicos[inverso]
+        else:
+            kmeans = KMeans(n_clusters=k, random_state=random_state, n_init='auto')
+            labels = kmeans.fit_predict(X)
+
+        score = silhouette_score(X, labels, sample_size=tamanho_amostra, random_state=random_state)
+        scores[k] = float(score)
+
+    return scores
+
+def otimizar_clusters(X, k_min=2, k_max=10, random_state=42, plot=True, metodo="kmeans", tamanho_amostra=5000):
+
+    scores = pontuar_clusters(X, k_min, k_max, random_state, metodo, tamanho_amostra)
 
     melhor_k = max(scores, key=scores.get)
 
     return melhor_k
 
-def cluster(ano, trimestre, k):
-           
-    file = pasta_base / f"pessoas_{ano}{trimestre}_{ano+1}{trimestre}_classificado.parquet"
+def escolher_k(ano, trimestre, k_min=2, k_max=10, metodo="exato", tamanho_amostra=5000, forcar=False):
+    """
+    Escolhe o melhor k para o painel {ano}.{trimestre} pelo silhouette amostrado.
+    O resultado fica guardado no manifesto do painel e só é recalculado se as entradas ou os parâmetros mudarem.
+    Retorna (melhor k, {k: silhouette}).
+    """
 
-    dados = pd.read_parquet(file)
+    file = caminho_painel(ano, trimestre)
+    hash_atual = hash_entradas(file)
+    parametros = {"k_min": k_min, "k_max": k_max, "metodo": metodo, "tamanho_amostra": tamanho_amostra}
 
-    validos = dados["log_renda"].notna() & (dados["classe_individuo"] <= 3)
-    rendas = dados.loc[validos, "log_renda"].values.reshape(-1, 1)
+    scores = None if forcar else ler_resultado(file, "escolha_k", hash_atual, parametros)
 
-    kmeans = KMeans(n_clusters=k, random_state=42).fit(rendas)
-    labels = kmeans.labels_
-    centros = kmeans.cluster_centers_.flatten()
-    
-    centros = kmeans.cluster_centers_.flatten()
+    if scores is None:
+        scores = pontuar_clusters(carregar_rendas(ano, trimestre), k_min, k_max,
+                                  metodo=metodo, tamanho_amostra=tamanho_amostra)
+        registrar_resultado(file, "escolha_k", hash_atual, parametros, {str(k): v for k, v in scores.items()})
+
+    scores = {int(k): v for k, v in scores.items()}
+
+    return max(scores, key=scores.get), scores
+
+def carregar_rendas(ano, trimestre):
+    """
+    Lê apenas a 'log_renda' dos indivíduos de classe 1 a 3 do painel, no formato (n, 1) usado pelo KMeans.
+    """
+
+    dados = ler_arquivo_cache(caminho_painel(ano, trimestre), colunas=["log_renda"], filtros=[("classe_individuo", "<=", 3)])
+
+    return dados["log_renda"].dropna().values.reshape(-1, 1)
+
+def ordenar_clusters(labels, centros):
+    """
+    Renumera os clusters em ordem crescente de centróide.
+    Retorna (labels renumerados, centros ordenados).
+    """
 
     ordem = np.argsort(centros)
-    centros_ordenados = centros[ordem]
-    
-    labels_ordenados = np.zeros_like(labels)
-    for novo_label, antigo_label in enumerate(ordem):
-        labels_ordenados[labels == antigo_label] = novo_label
+
+    # Permutação inversa: inversa[label antigo] = label novo
+    inversa = np.empty_like(ordem)
+    inversa[ordem] = np.arange(len(ordem))
+
+    return inversa[labels], centros[ordem]
+
+def kmeans_ponderado(valores, pesos, k, centros_iniciais=None):
+    """
+    KMeans do sklearn sobre valores 1-D com pesos (ex.: valores únicos e suas contagens).
+    Retorna (labels de cada valor, centros).
+    """
+
+    valores = np.asarray(valores, dtype=float).reshape(-1, 1)
+
+    # O sklearn mede a tolerância de parada relativa à variância (sem pesos) dos pontos recebidos.
+    # Com pesos, reescala para a variância dos dados originais, de modo que o critério de parada
+    # seja o mesmo que o KMeans teria sobre os pontos repetidos.
+    tol = 1e-4
+    if pesos is not None and np.var(valores) > 0:
+        media = np.average(valores.ravel(), weights=pesos)
+        tol *= np.average((valores.ravel() - media) ** 2, weights=pesos) / np.var(valores)
+
+    if centros_iniciais is None:
+        kmeans = KMeans(n_clusters=k, tol=tol, random_state=42)
+    else:
+        inicio = np.sort(np.asarray(centros_iniciais, dtype=float)).reshape(-1, 1)
+        kmeans = KMeans(n_clusters=k, init=inicio, n_init=1, tol=tol, random_state=42)
+
+    kmeans.fit(valores, sample_weight=pesos)
+
+    return kmeans.labels_, kmeans.cluster_centers_.flatten()
+
+def centros_kmeans_pp(rendas, k):
+    """
+    Centros iniciais do k-means++ sobre os pontos brutos, com semente fixa.
+    Usados pelos backends "sklearn" e "histograma" quando não há centros iniciais, para que os dois
+    partam dos mesmos centros e, portanto, cheguem aos mesmos labels.
+    """
+
+    rendas = np.asarray(rendas, dtype=float).reshape(-1, 1)
+    centros, _ = kmeans_plusplus(rendas, n_clusters=k, random_state=42)
+    return np.sort(centros.ravel())
+
+def ajustar_clusters(rendas, k, centros_iniciais=None, backend="sklearn"):
+    """
+    Agrupa as rendas (vetor 1-D) em k clusters e retorna (labels, centros), já ordenados pelo centróide.
+    Backends:
+      - "sklearn": KMeans sobre todos os pontos;
+      - "histograma": KMeans ponderado sobre os valores únicos e suas contagens. Cada iteração
+        de Lloyd é a mesma que sobre os dados brutos (pontos iguais sempre caem no mesmo cluster),
+        então, com os mesmos centros iniciais, os labels são idênticos, mas cada iteração custa
+        O(únicos·k) em vez de O(n·k);
+      - "exato": k-means 1-D ótimo (kmeans_1d_exato), também sobre o histograma.
+    Sem 'centros_iniciais', "sklearn" e "histograma" partem dos mesmos centros (centros_kmeans_pp),
+    então trocar de backend não muda os clusters.
+    """
+
+    rendas = np.asarray(rendas, dtype=float).ravel()
+
+    if centros_iniciais is None and backend in ("sklearn", "histograma"):
+        centros_iniciais = centros_kmeans_pp(rendas, k)
+
+    if backend == "sklearn":
+        labels, centros = kmeans_ponderado(rendas, None, k, centros_iniciais)
+    elif backend == "histograma":
+        unicos, contagens, inverso = histograma_1d(rendas)
+        labels_unicos, centros = kmeans_ponderado(unicos, contagens, k, centros_iniciais)
+        labels = labels_unicos[inverso]
+    elif backend == "exato":
+        centros, labels = kmeans_1d_exato(rendas, k)
+    else:
+        raise ValueError(f"Backend de clustering desconhecido: {backend}")
+
+    return ordenar_clusters(labels, centros)
+
+def rotular_por_centros(rendas, centros):
+    """
+    Atribui cada renda ao centro mais próximo. Em 1-D basta comparar com os pontos médios
+    entre centros consecutivos (centros em ordem crescente).
+    """
+
+    centros = np.sort(np.asarray(centros, dtype=float))
+    cortes = (centros[:-1] + centros[1:]) / 2
+
+    return np.searchsorted(cortes, np.asarray(rendas, dtype=float).ravel())
+
+def calcular_clusters(dados, k, centros_iniciais=None, backend="sklearn", centros_fixos=None):
+    """
+    Adiciona a coluna 'grupo_renda_kmeans' ao df, agrupando 'log_renda' dos indivíduos
+    de classe 1 a 3 em k clusters ordenados pelo centróide.
+    Se 'centros_iniciais' for passado (ex.: centros do trimestre anterior), o KMeans parte
+    deles com uma única inicialização, o que converge em poucas iterações e mantém o
+    significado de cada cluster estável entre trimestres.
+    Se 'centros_fixos' for passado (ex.: centros ajustados com todos os trimestres juntos),
+    não há ajuste: cada indivíduo vai para o centro mais próximo.
+    """
+
+    # classe_individuo é inteiro nullable (esquema.py): classes ausentes não entram
+    validos = dados["log_renda"].notna() & (dados["classe_individuo"] <= 3).fillna(False)
+    rendas = dados.loc[validos, "log_renda"].values
+
+    if centros_fixos is None:
+        labels_ordenados, centros_ordenados = ajustar_clusters(rendas, k, centros_iniciais, backend)
+    else:
+        centros_ordenados = np.sort(np.asarray(centros_fixos, dtype=float))
+        labels_ordenados = rotular_por_centros(rendas, centros_ordenados)
     
-    print(f"{ano}.{trimestre}")
     for i, c in enumerate(centros_ordenados):
         print(f"  Cluster {i}: centróide = {c:.2f}")
     
@@ -53,15 +278,156 @@ def cluster(ano, trimestre, k):
     for i in range(k):
         print(f"  Cluster {i}: {(dados['grupo_renda_kmeans'] == i).sum()}")
 
-    dados.to_parquet(file)
+    return dados
+
+def centros_clusters(dados):
+    """
+    Retorna os centróides (média de 'log_renda' de cada cluster), em ordem de cluster.
+    """
+    return dados.groupby("grupo_renda_kmeans")["log_renda"].mean().sort_index().to_numpy()
+
+def hash_centros(centros):
+    """
+    Hash curto dos centros (em ordem crescente), para identificá-los na versão do manifesto.
+    """
+    return hashlib.sha256(np.sort(np.asarray(centros, dtype=float)).tobytes()).hexdigest()[:12]
+
+def versao_clusters(k, backend="sklearn", centros_iniciais=None, centros_fixos=None, versao_log=None):
+    """
+    Monta a versão registrada no manifesto para 'grupo_renda_kmeans'. O número de clusters,
+    o backend e o modo (independente, sequencial ou centros fixos) fazem parte da versão:
+    mudar qualquer um deles exige recalcular. No modo sequencial, os centros iniciais (do trimestre
+    anterior) também entram na versão. 'versao_log' é a versão de 'log_renda' usada
+    como entrada: recalcular log_renda com outra versão também invalida os clusters.
+    """
+
+    versao = f"{versao_kmeans}-k{k}-log{versao_log}"
+    if backend != "sklearn":
+        versao += f"-{backend}"
+    if centros_fixos is not None:
+        versao += "-fixo-" + hash_centros(centros_fixos)
+    elif centros_iniciais is not None:
+        # Os centros vêm do trimestre anterior: se ele for reagrupado, este também precisa ser
+        versao += "-seq-" + hash_centros(centros_iniciais)
+    return versao
+
+def cluster(ano, trimestre, k, forcar=False, centros_iniciais=None, backend="sklearn", centros_fixos=None):
+    """
+    Calcula 'grupo_renda_kmeans' do painel e retorna os centróides ordenados,
+    que podem ser usados como ponto de partida do trimestre seguinte.
+    """
+           
+    file = caminho_painel(ano, trimestre)
+
+    hash_atual = hash_entradas(file)
+    # A versão de log_renda é a registrada no painel, e não a do código: é a que o k-means vai ler
+    versao_log = versao_registrada(file, "log_renda")
+    versoes = {"grupo_renda_kmeans": versao_clusters(k, backend, centros_iniciais, centros_fixos, versao_log)}
+
+    if not forcar and not precisa_atualizar(file, versoes, hash_atual):
+        print(f"{ano}.{trimestre} já está atualizado. Pulando.")
+        return centros_clusters(ler_arquivo(file, colunas=["log_renda", "grupo_renda_kmeans"]))
+
+    dados = ler_arquivo(file, colunas=["log_renda", "classe_individuo"])
+
+    print(f"{ano}.{trimestre}")
+    dados = calcular_clusters(dados, k, centros_iniciais, backend, centros_fixos)
+
+    escrever_derivadas(dados[["grupo_renda_kmeans"]], file)
+    registrar_transformacoes(file, versoes, hash_atual)
+
+    return centros_clusters(dados)
+
+def cluster_sequencial(trimestres, k, forcar=False, backend="sklearn"):
+    """
+    Agrupa os painéis em ordem cronológica, iniciando o KMeans de cada trimestre com os
+    centros ordenados do trimestre anterior. Assim o "Cluster 0" de um trimestre corresponde
+    ao "Cluster 0" do seguinte. Um trimestre que falha é reportado e a cadeia continua
+    a partir dos últimos centros válidos.
+    Retorna um dict {(ano, trimestre): centros}.
+    """
+
+    centros = None
+    resultado = {}
+
+    for ano, trimestre in trimestres:
+        try:
+            centros = cluster(ano, trimestre, k, forcar, centros_iniciais=centros, backend=backend)
+            resultado[(ano, trimestre)] = centros
+        except Exception as e:
+            print(f"  ERRO ao processar {ano}.{trimestre}: {e}")
+
+    return resultado
+
+def histograma_agrupado(trimestres):
+    """
+    Histograma de 'log_renda' (classe 1 a 3) de vários trimestres juntos, lido em uma única varredura
+    do dataset de painéis (apenas as partições dos trimestres pedidos são abertas).
+    Retorna (valores únicos, contagens).
+    """
+
+    filtros = [[("ano_inicio", "=", ano), ("trimestre_inicio", "=", trimestre), ("classe_individuo", "<=", 3)]
+               for ano, trimestre in trimestres]
+    dados = ler_paineis(colunas=["log_renda"], filtros=filtros)
+
+    unicos, contagens, _ = histograma_1d(dados["log_renda"].dropna().to_numpy(dtype=float))
+
+    return unicos, contagens
+
+def ajustar_agrupado(trimestres, k, backend="histograma"):
+    """
+    Ajusta um único conjunto de k centros com os dados de todos os trimestres juntos,
+    definindo uma partição de renda comum a todo o período. Retorna os centros ordenados.
+    """
+
+    unicos, contagens = histograma_agrupado(trimestres)
+
+    if backend == "exato":
+        centros, _ = kmeans_1d_exato(unicos, k, pesos=contagens)
+    else:
+        # Mesma inicialização de ajustar_clusters, sobre os pontos brutos reconstruídos do histograma
+        iniciais = centros_kmeans_pp(np.repeat(unicos, contagens), k)
+        _, centros = kmeans_ponderado(unicos, contagens, k, iniciais)
+
+    return np.sort(centros)
+
+def cluster_agrupado(trimestres, k, forcar=False, backend="histograma", workers=1):
+    """
+    Ajusta os centros com todos os trimestres juntos e grava em cada painel o cluster
+    do centro mais próximo. Retorna os centros comuns.
+    """
+
+    centros = ajustar_agrupado(trimestres, k, backend)
+    print("Centros comuns: " + ", ".join(f"{c:.2f}" for c in centros))
+
+    tarefas = [(ano, trimestre, k, forcar, None, backend, centros) for ano, trimestre in trimestres]
+    executar_trimestres(cluster, tarefas, workers)
+
+    return centros
 
 if (__name__ == "__main__"):
-    anos = range(2012, 2025)
-    tri = range(1, 5)
-
-    for ano in anos:
-        for trimestre in tri:
-            if ano == 2024 and trimestre == 3:
-                break
-            
-            cluster(ano, trimestre, 2)
\ No newline at end of file
+    parser = criar_parser("Agrupa a log_renda de cada painel em clusters com k-means.", incremental=True)
+    parser.add_argument("--escolher-k", action="store_true",
+                        help="Apenas calcula o melhor k de cada painel pelo silhouette amostrado, sem gravar clusters")
+    parser.add_argument("--sequencial", action="store_true",
+                        help="Inicia o k-means de cada trimestre com os centros do trimestre anterior (ignora --workers)")
+    parser.add_argument("--agrupado", action="store_true",
+                        help="Ajusta centros comuns com todos os trimestres juntos e aplica a cada painel")
+    parser.add_argument("--backend", choices=["sklearn", "histograma", "exato"], default="sklearn",
+                        help="Algoritmo de clustering (padrão: sklearn sobre todos os pontos)")
+    args = parser.parse_args()
+
+    if args.sequencial:
+        # A inicialização depende do trimestre anterior, então a execução é necessariamente serial
+        cluster_sequencial(listar_trimestres(2024, 2), 2, args.forcar, args.backend)
+    elif args.agrupado:
+        backend = "histograma" if args.backend == "sklearn" else args.backend
+        cluster_agrupado(listar_trimestres(2024, 2), 2, args.forcar, backend, args.workers)
+    elif args.escolher_k:
+        tarefas = [(ano, trimestre, 2, 10, "exato", 5000, args.forcar) for ano, trimestre in listar_trimestres(2024, 2)]
+        for (ano, trimestre, *_), resultado, erro in executar_trimestres(escolher_k, tarefas, args.workers):
+            if erro is None:
+                print(f"{ano}.{trimestre}: melhor k = {resultado[0]}")
+    else:
+        tarefas = [(ano, trimestre, 2, args.forcar, None, args.backend) for ano, trimestre in listar_trimestres(2024, 2)]
+        executar_trimestres(cluster, tarefas, args.workers)
\ No newline at end of file
@@ -1,38 +1,53 @@
-from pathlib import Path
 import pandas as pd
 import numpy as np
+from paineis import ler_arquivo, escrever_derivadas, listar_paineis, colunas_painel
+from agendador import criar_parser, executar_trimestres
+from manifesto import hash_entradas, precisa_atualizar, registrar_transformacoes
 
-def processar_dados(file):
-    try:
-        # Ler o df
-        df = pd.read_parquet(file)
-        
-        # Inicializa a coluna com NaN
-        df["log_renda"] = np.nan
-        
-        if "VD4019" in df.columns:
-            mask = df["VD4019"].notna() & (df["VD4019"] > 0)
-            
-            # calcula o log apenas onde mask é verdadeira
-            df.loc[mask, "log_renda"] = np.log(df.loc[mask, "VD4019"])
-
-            #  Sobrescrever o arquivo original com o df modificado
-            df.to_parquet(file, index=False)
-        
-            print(f"  Sucesso: {file} foi atualizado com 'log_renda'.")
-        else:
-            print(f"  AVISO: Coluna 'VD4019' não encontrada em {file}. Pulando.")
-
-    except Exception as e:
-        print(f"  ERRO ao processar {file}: {e}")
+# Incrementar sempre que a forma de calcular a coluna mudar
+versao_log_renda = "1"
+
+def calcular_log_renda(df):
+    """
+    Adiciona a coluna 'log_renda' ao df (log de VD4019 apenas para rendas positivas).
+    """
+    # Inicializa a coluna com NaN
+    df["log_renda"] = np.nan
+
+    mask = df["VD4019"].notna() & (df["VD4019"] > 0)
+
+    # calcula o log apenas onde mask é verdadeira
+    df.loc[mask, "log_renda"] = np.log(df.loc[mask, "VD4019"])
+
+    return df
+
+def processar_dados(file, forcar=False):
+    # Erros não são capturados aqui: executar_trimestres os reporta por trimestre no resumo final
+    hash_atual = hash_entradas(file)
+    versoes = {"log_renda": versao_log_renda}
+
+    # Pula painéis cujas entradas e versão da transformação não mudaram
+    if not forcar and not precisa_atualizar(file, versoes, hash_atual):
+        print(f"  {file} já está atualizado. Pulando.")
+        return
+
+    if "VD4019" in colunas_painel(file):
+        # Lê só a renda e grava a nova coluna em um arquivo lateral, sem reescrever o painel
+        df = calcular_log_renda(ler_arquivo(file, colunas=["VD4019"]))
+        escrever_derivadas(df[["log_renda"]], file)
+        registrar_transformacoes(file, versoes, hash_atual)
+
+        print(f"  Sucesso: {file} foi atualizado com 'log_renda'.")
+    else:
+        print(f"  AVISO: Coluna 'VD4019' não encontrada em {file}. Pulando.")
 
 if __name__ == "__main__":
-    pasta_base = Path("PNAD_data/Pareamentos")
-    arquivos = sorted(pasta_base.glob("pessoas_*_classificado.parquet"))
+    parser = criar_parser("Adiciona a coluna log_renda a todos os painéis classificados.", incremental=True)
+    args = parser.parse_args()
+
+    arquivos = list(listar_paineis().values())
     print(f"Encontrados {len(arquivos)} arquivos para processar...")
 
-    for file in arquivos:
-        print(f"Processando: {file.name}")
-        processar_dados(file)
+    executar_trimestres(processar_dados, [(file, args.forcar) for file in arquivos], args.workers)
 
     print("\nProcessamento concluído.")
\ No newline at end of file
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pyarrow.parquet as pq
+from paineis import pasta_base, assinatura_painel, nome_painel, colunas_painel
+
+# Um arquivo JSON por painel, para que processos em paralelo nunca escrevam no mesmo arquivo
+pasta_manifesto = pasta_base / "manifesto"
+
+# Colunas de entrada das quais dependem as colunas derivadas
+colunas_entrada = ["VD4019", "classe_individuo"]
+
+def caminho_manifesto(file):
+    """
+    Retorna o caminho do manifesto do painel 'file'. O nome não depende do formato do caminho
+    (arquivo antigo ou partição do dataset), para que o manifesto sobreviva à migração.
+    """
+    return pasta_manifesto / f"{nome_painel(file)}.json"
+
+def ler_manifesto(file):
+    """
+    Lê o manifesto do painel. Retorna um dict vazio se ele não existir ou estiver corrompido.
+    """
+
+    caminho = caminho_manifesto(file)
+
+    if not caminho.exists():
+        return {}
+
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        print(f"  AVISO: manifesto inválido em {caminho}, será recriado.")
+        return {}
+
+def salvar_manifesto(file, manifesto):
+    """
+    Grava o manifesto do painel de forma atômica (arquivo temporário + rename).
+    """
+
+    caminho = caminho_manifesto(file)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+
+    temporario = caminho.with_suffix(f".{os.getpid()}.tmp")
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=2, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+def hash_entradas(file):
+    """
+    Calcula o hash (sha256) do conteúdo das colunas de entrada do painel, lendo apenas essas colunas.
+    """
+
+    colunas = [c for c in colunas_entrada if c in pq.read_schema(file).names]
+    tabela = pq.read_table(file, columns=colunas)
+
+    h = hashlib.sha256()
+    for nome in colunas:
+        # Converte para float64 para que mudar apenas o tipo da coluna não altere o hash
+        valores = tabela.column(nome).to_pandas().to_numpy(dtype="float64", na_value=np.nan)
+        h.update(nome.encode())
+        h.update(np.ascontiguousarray(valores).tobytes())
+
+    return h.hexdigest()
+
+def precisa_atualizar(file, versoes, hash_atual):
+    """
+    Indica se alguma das colunas derivadas em 'versoes' ({coluna: versão}) precisa ser recalculada:
+    entradas alteradas, versão da transformação diferente ou coluna ausente no painel e nos arquivos laterais.
+    """
+
+    manifesto = ler_manifesto(file)
+
+    if manifesto.get("hash_entradas") != hash_atual:
+        return True
+
+    feitas = manifesto.get("transformacoes", {})
+    if any(feitas.get(coluna) != versao for coluna, versao in versoes.items()):
+        return True
+
+    # O painel pode ter sido reescrito depois (ex.: nova classificação no R), o que invalida os arquivos laterais
+    colunas_arquivo = colunas_painel(file)
+    return any(coluna not in colunas_arquivo for coluna in versoes)
+
+def versao_registrada(file, coluna):
+    """
+    Versão da transformação com que a coluna derivada foi calculada, segundo o manifesto (None se não houver).
+    """
+    return ler_manifesto(file).get("transformacoes", {}).get(coluna)
+
+def registrar_transformacoes(file, versoes, hash_atual):
+    """
+    Registra no manifesto que as colunas em 'versoes' foram calculadas a partir das entradas com 'hash_atual'.
+    """
+
+    manifesto = ler_manifesto(file)
+
+    # Entradas novas invalidam todas as transformações registradas antes
+    if manifesto.get("hash_entradas") != hash_atual:
+        manifesto = {"hash_entradas": hash_atual, "transformacoes": {}}
+
+    manifesto.setdefault("transformacoes", {}).update(versoes)
+    salvar_manifesto(file, manifesto)
+
+def registrar_contagem_classes(file, contagem):
+    """
+    Guarda no manifesto o histograma de 'classe_individuo' ({classe: n}) do painel,
+    junto com a assinatura do arquivo para detectar se ele foi reescrito depois.
+    """
+
+    manifesto = ler_manifesto(file)
+    manifesto["contagem_classes"] = {
+        "assinatura": assinatura_painel(file),
+        "contagem": {str(int(classe)): int(n) for classe, n in contagem.items()},
+    }
+    salvar_manifesto(file, manifesto)
+
+def ler_contagem_classes(file):
+    """
+    Retorna o histograma de 'classe_individuo' guardado no manifesto ({classe: n}),
+    ou None se ele não existir ou o painel tiver sido reescrito desde então.
+    """
+
+    registro = ler_manifesto(file).get("contagem_classes")
+
+    if registro is None or registro.get("assinatura") != assinatura_painel(file):
+        return None
+
+    return {int(classe): n for classe, n in registro["contagem"].items()}
+
+def ler_resultado(file, nome, hash_atual, parametros):
+    """
+    Retorna um resultado guardado no manifesto sob 'nome' se ele foi calculado com as mesmas
+    entradas ('hash_atual') e os mesmos 'parametros' (dict); caso contrário retorna None.
+    """
+
+    registro = ler_manifesto(file).get("resultados", {}).get(nome)
+
+    if registro is None or registro.get("hash_entradas") != hash_atual or registro.get("parametros") != parametros:
+        return None
+
+    return registro["valor"]
+
+def registrar_resultado(file, nome, hash_atual, parametros, valor):
+    """
+    Guarda no manifesto um resultado (serializável em JSON) calculado a partir das entradas do painel.
+    """
+
+    manifesto = ler_manifesto(file)
+    manifesto.setdefault("resultados", {})[nome] = {
+        "hash_entradas": hash_atual,
+        "parametros": parametros,
+        "valor": valor,
+    }
+    salvar_manifesto(file, manifesto)
@@ -0,0 +1,187 @@
+from pathlib import Path
+import json
+import pandas as pd
+from grupos import grupos_suffix, deflator_suffix
+
+pasta_dados = Path("dados_medianas_var")
+nome_arquivo_metricas = "metricas.parquet"
+nome_arquivo_resumo = "resumo_metricas.json"
+# Todas as estatísticas de variação por grupo (gerado por variacao_renda.py), no formato longo
+nome_arquivo_estatisticas = "estatisticas_variacao.parquet"
+
+def compilar_metricas(pasta=pasta_dados):
+    """
+    Junta os CSVs medianas_variacao_renda{sufixo}.csv de todos os grupos (com e sem deflator),
+    e as demais estatísticas do estatisticas_variacao.parquet se ele existir, em uma única tabela no formato longo:
+    grupo, deflacionado, ano_final, trimestre, estatistica, valor, obs.
+    """
+
+    pasta = Path(pasta)
+    partes = []
+
+    for grupo, sufixo in grupos_suffix.items():
+        for codigo in deflator_suffix.values():
+            file = pasta / f"medianas_variacao_renda{sufixo}{codigo}.csv"
+
+            # caso o arquivo nao exista
+            if not file.exists():
+                print(f"Arquivo não encontrado, pulando: {file}")
+                continue
+
+            df = pd.read_csv(file)
+            partes.append(pd.DataFrame({
+                "grupo": grupo,
+                "deflacionado": codigo == "D",
+                "ano_final": df["ano_final"],
+                "trimestre": df["trimestre"],
+                "estatistica": "mediana_variacao",
+                "valor": df["mediana_variacao"],
+                "obs": df["obs"],
+            }))
+
+    # Acrescenta as demais estatísticas (média, percentis, variação nula) quando disponíveis
+    file = pasta / nome_arquivo_estatisticas
+    if file.exists():
+        partes.append(pd.read_parquet(file).astype({"grupo": "str", "estatistica": "str"}))
+
+    return tipar_metricas(pd.concat(partes, ignore_index=True))
+
+def tipar_metricas(metricas):
+    """
+    Aplica os tipos compactos da tabela de métricas: categorias para grupo e estatística
+    (na ordem de grupos_suffix) e inteiros pequenos para ano, trimestre e obs.
+    """
+
+    estatisticas = list(dict.fromkeys(metricas["estatistica"]))
+
+    return metricas.astype({
+        "grupo": pd.CategoricalDtype(list(grupos_suffix)),
+        "deflacionado": "bool",
+        "ano_final": "int16",
+        "trimestre": "int8",
+        "estatistica": pd.CategoricalDtype(estatisticas),
+        "valor": "float64",
+        "obs": "Int32",
+    })
+
+def limites_serie(serie):
+    """
+    Limites de uma série (ano_final, mediana_variacao) usados nos filtros do app:
+    anos mínimo/máximo e mediana mínima/máxima.
+    """
+
+    return {
+        "ano_min": int(serie["ano_final"].min()),
+        "ano_max": int(serie["ano_final"].max()),
+        "mediana_min": float(serie["mediana_variacao"].min()),
+        "mediana_max": float(serie["mediana_variacao"].max()),
+    }
+
+def resumir_metricas(metricas):
+    """
+    Resumo pequeno das métricas para o app montar os filtros sem carregar as séries:
+    limites da Base por código de deflator ("D" ou "").
+    """
+
+    resumo = {}
+    for codigo in deflator_suffix.values():
+        base = serie_grupo(metricas, "Base", codigo == "D")
+        if not base.empty:
+            resumo[codigo] = limites_serie(base)
+    return resumo
+
+def salvar_metricas(metricas, pasta=pasta_dados):
+    """
+    Grava a tabela de métricas em um único arquivo Parquet, junto com o resumo em JSON.
+    """
+
+    path_saida = Path(pasta) / nome_arquivo_metricas
+    metricas.to_parquet(path_saida, index=False)
+    print(f"Arquivo de métricas salvo em: {path_saida}")
+
+    path_resumo = Path(pasta) / nome_arquivo_resumo
+    with open(path_resumo, "w") as f:
+        json.dump(resumir_metricas(metricas), f, indent=2)
+    print(f"Resumo das métricas salvo em: {path_resumo}")
+
+def construir_metricas(pasta=pasta_dados):
+    """
+    Compila os CSVs por grupo e grava o arquivo consolidado de métricas.
+    """
+
+    metricas = compilar_metricas(pasta)
+    salvar_metricas(metricas, pasta)
+    return metricas
+
+def adicionar_periodo(metricas):
+    """
+    Acrescenta a coluna 'periodo' (ex: "2012.1") usada no eixo X dos gráficos,
+    para que seja calculada uma única vez ao carregar as métricas.
+    """
+
+    periodo = metricas["ano_final"].astype(str) + "." + metricas["trimestre"].astype(str)
+    return metricas.assign(periodo=periodo)
+
+def serie_grupo(metricas, grupo, deflacionado, estatistica="mediana_variacao"):
+    """
+    Recorta a série de um grupo no mesmo formato dos CSVs: ano_final, trimestre, mediana_variacao, obs.
+    """
+
+    recorte = metricas[
+        (metricas["grupo"] == grupo) &
+        (metricas["deflacionado"] == deflacionado) &
+        (metricas["estatistica"] == estatistica)
+    ]
+
+    return pd.DataFrame({
+        "ano_final": recorte["ano_final"].astype(int),
+        "trimestre": recorte["trimestre"].astype(int),
+        "mediana_variacao": recorte["valor"],
+        "obs": recorte["obs"].astype(int),
+    }).reset_index(drop=True)
+
+# Estatísticas com os limites do intervalo de confiança da estatística de cada grupo
+estatisticas_intervalo = ["ic_inferior", "ic_superior"]
+
+def series_grupos(metricas, grupos, deflacionado, estatistica="mediana_variacao", rotulos=None):
+    """
+    Recorta as séries de vários grupos de uma só vez, empilhadas na ordem de 'grupos',
+    com a coluna 'Grupo' identificando cada uma ('rotulos' permite trocar o nome exibido).
+    Se as métricas tiverem o intervalo de confiança, inclui as colunas ic_inferior e ic_superior.
+    """
+
+    do_grupo = metricas["grupo"].isin(grupos) & (metricas["deflacionado"] == deflacionado)
+    recorte = metricas[do_grupo & (metricas["estatistica"] == estatistica)]
+
+    # Limites do intervalo de confiança, alinhados às linhas do recorte por (grupo, ano_final, trimestre)
+    intervalos = metricas[do_grupo & metricas["estatistica"].isin(estatisticas_intervalo)]
+    if not intervalos.empty:
+        intervalos = intervalos.pivot_table(
+            index=["grupo", "ano_final", "trimestre"], columns="estatistica", values="valor", observed=True
+        )
+        recorte = recorte.join(intervalos[estatisticas_intervalo], on=["grupo", "ano_final", "trimestre"])
+
+    # Ordena pela posição do grupo em 'grupos', mantendo a ordem temporal dentro de cada grupo
+    ordem = recorte["grupo"].astype(str).map({grupo: i for i, grupo in enumerate(grupos)})
+    recorte = recorte.assign(_ordem=ordem).sort_values("_ordem", kind="stable")
+
+    rotulos = rotulos or {}
+    colunas = {
+        "ano_final": recorte["ano_final"].astype(int),
+        "trimestre": recorte["trimestre"].astype(int),
+        "mediana_variacao": recorte["valor"],
+        "obs": recorte["obs"].astype(int),
+        "Grupo": recorte["grupo"].astype(str).replace(rotulos),
+    }
+    # Reaproveita o 'periodo' já calculado (adicionar_periodo), se houver
+    if "periodo" in recorte:
+        colunas["periodo"] = recorte["periodo"]
+
+    for coluna in estatisticas_intervalo:
+        if coluna in recorte:
+            colunas[coluna] = recorte[coluna]
+
+    return pd.DataFrame(colunas).reset_index(drop=True)
+
+if __name__ == "__main__":
+    construir_metricas()
@@ -0,0 +1,441 @@
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import re
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+from esquema import aplicar_esquema, colunas_fora_do_esquema, esquema_arrow
+
+pasta_base = Path("PNAD_data/Pareamentos")
+
+# Linhas por row group ao escrever um painel. Blocos menores permitem que leituras com filtro
+# pulem row groups inteiros usando as estatísticas (min/max) gravadas no rodapé do Parquet.
+tamanho_row_group = 32_768
+
+# Os painéis formam um único dataset particionado (hive) pelo ano e trimestre da primeira entrevista:
+# {pasta_base}/paineis/ano_inicio=2020/trimestre_inicio=2/painel.parquet.
+# Painéis ainda no formato antigo (pessoas_20202_20212_classificado.parquet, como o R grava)
+# continuam sendo lidos; migrar_paineis os move para o dataset e deixa um link com o nome antigo.
+pasta_dataset = pasta_base / "paineis"
+nome_arquivo_particao = "painel.parquet"
+colunas_particao = pa.schema([("ano_inicio", pa.int16()), ("trimestre_inicio", pa.int8())])
+padrao_nome_antigo = re.compile(r"pessoas_(\d{4})(\d)_\d{4}\d_classificado\.parquet")
+
+# As colunas derivadas (log_renda, grupo_renda, grupo_renda_kmeans) não são gravadas dentro do painel:
+# cada uma fica em um Parquet próprio, alinhado linha a linha com o painel base, em
+# {pasta_base}/derivadas/{nome_painel}/{coluna}.parquet. Calcular ou recalcular uma coluna grava só esse
+# arquivo (algumas centenas de KB por trimestre) e o painel base não é mais reescrito pelo Python.
+# Cada arquivo lateral guarda nos metadados a assinatura do painel de onde saiu: se o painel mudar
+# (ex.: nova classificação no R), as colunas derivadas antigas deixam de ser usadas.
+pasta_derivadas = pasta_base / "derivadas"
+
+def caminho_antigo(ano, trimestre, pasta=pasta_base):
+    """
+    Caminho do painel no formato antigo, com o período no nome do arquivo.
+    """
+    return Path(pasta) / f"pessoas_{ano}{trimestre}_{ano+1}{trimestre}_classificado.parquet"
+
+def caminho_particao(ano, trimestre, pasta=pasta_base):
+    """
+    Caminho do painel dentro do dataset particionado.
+    """
+    return Path(pasta) / "paineis" / f"ano_inicio={ano}" / f"trimestre_inicio={trimestre}" / nome_arquivo_particao
+
+def caminho_painel(ano, trimestre):
+    """
+    Caminho do painel classificado que vai de {ano}.{trimestre} até {ano+1}.{trimestre}:
+    a partição do dataset, se o painel já foi migrado; senão, o arquivo no formato antigo.
+    """
+    particao = caminho_particao(ano, trimestre)
+    return particao if particao.exists() else caminho_antigo(ano, trimestre)
+
+def periodo_painel(file):
+    """
+    Retorna (ano, trimestre) da primeira entrevista a partir do caminho do painel, em qualquer
+    um dos formatos, ou None se o caminho não for de um painel.
+    """
+
+    file = Path(file)
+    antigo = padrao_nome_antigo.fullmatch(file.name)
+    if antigo:
+        return int(antigo[1]), int(antigo[2])
+
+    if file.name == nome_arquivo_particao and file.parent.name.startswith("trimestre_inicio="):
+        return int(file.parent.parent.name.split("=")[1]), int(file.parent.name.split("=")[1])
+
+    return None
+
+def nome_painel(file):
+    """
+    Nome estável do painel (o nome antigo sem extensão), igual nos dois formatos.
+    Usado, por exemplo, para nomear o manifesto.
+    """
+
+    periodo = periodo_painel(file)
+    return caminho_antigo(*periodo).stem if periodo else Path(file).stem
+
+def listar_paineis(pasta=pasta_base):
+    """
+    Lista os painéis existentes como {(ano, trimestre): caminho}, em ordem.
+    Quando um painel existe nos dois formatos, vale a partição do dataset.
+    """
+
+    pasta = Path(pasta)
+    paineis = {}
+
+    for file in pasta.glob("pessoas_*_classificado.parquet"):
+        if periodo_painel(file):
+            paineis[periodo_painel(file)] = file
+
+    for file in pasta.glob(f"paineis/ano_inicio=*/trimestre_inicio=*/{nome_arquivo_particao}"):
+        paineis[periodo_painel(file)] = file
+
+    return dict(sorted(paineis.items()))
+
+def dataset_paineis(pasta=pasta_base):
+    """
+    Expõe todos os painéis como um único dataset do pyarrow, com as colunas de partição
+    'ano_inicio' e 'trimestre_inicio'. Filtros nessas colunas descartam painéis inteiros
+    sem abri-los, e os demais filtros usam as estatísticas dos row groups.
+    O schema é a união dos schemas dos painéis (colunas ausentes em um painel vêm nulas), com as colunas
+    do esquema (esquema.py) nos tipos compactos: painéis gravados pelo R depois da conversão, ainda com
+    os códigos como texto, são convertidos durante a leitura.
+    """
+
+    paineis = listar_paineis(pasta)
+    arquivos = [str(file) for file in paineis.values()]
+
+    campos = {}
+    for file in arquivos:
+        for campo in pq.read_schema(file):
+            campos.setdefault(campo.name, []).append(campo)
+
+    try:
+        esquema = pa.schema([
+            pa.field(nome, esquema_arrow[nome]) if nome in esquema_arrow
+            else pa.unify_schemas([pa.schema([campo]) for campo in lista], promote_options="permissive").field(0)
+            for nome, lista in campos.items()
+        ])
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        raise ValueError(f"Painéis com tipos incompatíveis; uniformize-os com 'python esquema.py'. ({e})") from e
+
+    for campo in colunas_particao:
+        esquema = esquema.append(campo)
+
+    particoes = [(ds.field("ano_inicio") == ano) & (ds.field("trimestre_inicio") == trimestre)
+                 for ano, trimestre in paineis]
+
+    return ds.FileSystemDataset.from_paths(
+        arquivos, schema=esquema, format=ds.ParquetFileFormat(),
+        filesystem=pafs.LocalFileSystem(), partitions=particoes,
+    )
+
+def tabela_no_esquema(tabela):
+    """
+    Converte as colunas do esquema (esquema.py) para os tipos compactos, como no dataset_paineis,
+    para que tabelas de painéis convertidos e não convertidos possam ser concatenadas.
+    """
+
+    for i, campo in enumerate(tabela.schema):
+        tipo = esquema_arrow.get(campo.name)
+        if tipo is not None and campo.type != tipo:
+            tabela = tabela.set_column(i, pa.field(campo.name, tipo), pc.cast(tabela.column(i), tipo))
+    return tabela
+
+def ler_paineis(colunas=None, filtros=None, pasta=pasta_base):
+    """
+    Lê vários painéis em uma única varredura do dataset e retorna um DataFrame.
+    'colunas' e 'filtros' seguem ler_arquivo e podem usar 'ano_inicio' e 'trimestre_inicio', por exemplo
+    ler_paineis(["log_renda"], [("classe_individuo", "<=", 3), ("ano_inicio", ">=", 2019), ("ano_inicio", "<=", 2023)]).
+    Se alguma coluna pedida vem de arquivos laterais, cada painel selecionado é lido com ler_tabela e
+    os resultados são concatenados (colunas ausentes em um painel vêm nulas, como no dataset).
+    """
+
+    dataset = dataset_paineis(pasta)
+    filtro = pq.filters_to_expression(filtros) if filtros else None
+
+    # Só as partições que passam nos filtros de ano_inicio e trimestre_inicio são consideradas
+    arquivos = [fragmento.path for fragmento in dataset.get_fragments(filter=filtro)]
+    derivadas = {file: derivadas_painel(file) for file in arquivos}
+
+    nomes = dataset.schema.names + sorted({c for d in derivadas.values() for c in d} - set(dataset.schema.names))
+    colunas = nomes if colunas is None else list(colunas)
+    usadas = set(colunas) | set(colunas_filtros(filtros))
+
+    if not any(usadas & set(d) for d in derivadas.values()):
+        return para_pandas(dataset.to_table(columns=colunas, filter=filtro))
+
+    tabelas = []
+    for file in arquivos:
+        ano, trimestre = periodo_painel(file)
+        disponiveis = colunas_painel(file, derivadas[file])
+        tabela = ler_tabela(file, [c for c in disponiveis if c in usadas], derivadas=derivadas[file])
+
+        for campo, valor in zip(colunas_particao, (ano, trimestre)):
+            tabela = tabela.append_column(campo, pa.repeat(pa.scalar(valor, campo.type), tabela.num_rows))
+        for coluna in usadas - set(tabela.column_names):
+            tabela = tabela.append_column(coluna, pa.nulls(tabela.num_rows))
+        tabela = tabela_no_esquema(tabela)
+
+        tabelas.append(tabela.filter(filtro) if filtro is not None else tabela)
+
+    # Sem os metadados do pandas (que variam entre painéis), para_pandas aplica o esquema a todas as colunas
+    tabela = pa.concat_tables(tabelas, promote_options="permissive").select(colunas)
+    return para_pandas(tabela.replace_schema_metadata(None))
+
+def migrar_paineis(pasta=pasta_base, manter_links=True):
+    """
+    Move os painéis do formato antigo para o dataset particionado (sem reescrevê-los).
+    Com manter_links=True, o nome antigo vira um link simbólico para a partição,
+    para que os scripts em R e o código que ainda monta o nome antigo continuem funcionando.
+    """
+
+    pasta = Path(pasta)
+
+    for file in sorted(pasta.glob("pessoas_*_classificado.parquet")):
+        periodo = periodo_painel(file)
+        if periodo is None or file.is_symlink():
+            continue
+
+        particao = caminho_particao(*periodo, pasta=pasta)
+        particao.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(file, particao)
+
+        if manter_links:
+            os.symlink(os.path.relpath(particao, file.parent), file)
+
+        print(f"  {file.name} -> {particao}")
+
+def rodape_painel(file):
+    """
+    Retorna os bytes do rodapé do Parquet, que contém o schema, o número de linhas
+    e as estatísticas de cada row group.
+    """
+
+    with open(file, "rb") as f:
+        # Os últimos 8 bytes são o tamanho do rodapé (4 bytes) e a marca "PAR1"
+        f.seek(-8, os.SEEK_END)
+        tamanho_rodape = int.from_bytes(f.read(4), "little")
+        f.seek(-8 - tamanho_rodape, os.SEEK_END)
+        return f.read(tamanho_rodape)
+
+def assinatura_painel(file):
+    """
+    Retorna o hash (sha256) do rodapé do Parquet. Muda sempre que o conteúdo do painel muda,
+    mas custa apenas a leitura de alguns KB do fim do arquivo.
+    """
+    return hashlib.sha256(rodape_painel(file)).hexdigest()
+
+def caminho_derivada(file, coluna):
+    """
+    Caminho do arquivo lateral com a coluna derivada 'coluna' do painel 'file'.
+    """
+    return pasta_derivadas / nome_painel(file) / f"{coluna}.parquet"
+
+def derivadas_painel(file):
+    """
+    Lista as colunas derivadas do painel como {coluna: caminho}, apenas as calculadas a partir
+    da versão atual do painel. Arquivos laterais desatualizados são ignorados (com um aviso).
+    """
+
+    pasta = pasta_derivadas / nome_painel(file)
+    if not pasta.exists():
+        return {}
+
+    assinatura = assinatura_painel(file).encode()
+    derivadas = {}
+
+    for caminho in sorted(pasta.glob("*.parquet")):
+        if (pq.read_schema(caminho).metadata or {}).get(b"assinatura_painel") == assinatura:
+            derivadas[caminho.stem] = caminho
+        else:
+            print(f"  AVISO: {caminho} foi calculado a partir de outra versão do painel e será ignorado.")
+
+    return derivadas
+
+def colunas_painel(file, derivadas=None):
+    """
+    Colunas que podem ser lidas do painel: as do painel base e as derivadas válidas.
+    """
+
+    if derivadas is None:
+        derivadas = derivadas_painel(file)
+
+    base = pq.read_schema(file).names
+    return base + [coluna for coluna in derivadas if coluna not in base]
+
+def assinatura_completa(file, derivadas=None):
+    """
+    Assinatura do painel e das suas colunas derivadas válidas: muda quando o painel
+    ou qualquer um dos arquivos laterais é reescrito.
+    """
+
+    if derivadas is None:
+        derivadas = derivadas_painel(file)
+
+    h = hashlib.sha256(rodape_painel(file))
+    for coluna, caminho in derivadas.items():
+        h.update(coluna.encode())
+        h.update(rodape_painel(caminho))
+    return h.hexdigest()
+
+def colunas_filtros(filtros):
+    """
+    Colunas usadas nos filtros, que podem ser uma lista de condições ou uma lista de listas (OR de ANDs).
+    """
+    return [coluna for item in (filtros or []) for coluna, _, _ in (item if isinstance(item, list) else [item])]
+
+def ler_tabela(file, colunas=None, filtros=None, derivadas=None):
+    """
+    Lê um painel como tabela Arrow, juntando às colunas do painel base as colunas derivadas.
+    'derivadas' é o resultado de derivadas_painel (None consulta a pasta; {} lê só o painel base).
+    Só os arquivos laterais das colunas pedidas ou usadas nos filtros são abertos; sem nenhum deles,
+    a projeção e os filtros são aplicados pelo pyarrow durante a leitura, como em um Parquet comum.
+    Uma coluna derivada tem precedência sobre a coluna de mesmo nome que painéis antigos têm gravada.
+    """
+
+    if derivadas is None:
+        derivadas = derivadas_painel(file)
+
+    base = pq.read_schema(file)
+    if colunas is None:
+        colunas = colunas_painel(file, derivadas)
+
+    usadas = set(colunas) | set(colunas_filtros(filtros))
+    laterais = {coluna: caminho for coluna, caminho in derivadas.items() if coluna in usadas}
+
+    if not laterais:
+        return pq.read_table(file, columns=list(colunas), filters=filtros)
+
+    # O painel base é lido sem filtro para que as linhas continuem alinhadas com os arquivos laterais
+    tabela = pq.read_table(file, columns=[c for c in base.names if c in usadas and c not in laterais])
+    for coluna, caminho in laterais.items():
+        tabela = tabela.append_column(coluna, pq.read_table(caminho, columns=[coluna]).column(coluna))
+
+    # Os metadados do pandas do painel base não descrevem as colunas que vieram dos arquivos laterais
+    metadados = dict(tabela.schema.metadata or {})
+    if b"pandas" in metadados:
+        pandas = json.loads(metadados[b"pandas"])
+        pandas["columns"] = [c for c in pandas["columns"] if c["name"] not in laterais]
+        metadados[b"pandas"] = json.dumps(pandas).encode()
+        tabela = tabela.replace_schema_metadata(metadados)
+
+    # Filtra antes de projetar: os filtros podem usar colunas que não foram pedidas
+    if filtros:
+        tabela = tabela.filter(pq.filters_to_expression(filtros))
+    return tabela.select(list(colunas))
+
+def para_pandas(tabela, **opcoes):
+    """
+    Converte a tabela para DataFrame. As colunas sem metadados do pandas (as que vieram de arquivos
+    laterais) voltam aos tipos do esquema, já que o Arrow não distingue, por exemplo, Int8 de float com ausentes.
+    """
+
+    descritas = {c["name"] for c in (tabela.schema.pandas_metadata or {}).get("columns", [])}
+    dados = tabela.to_pandas(**opcoes)
+    return aplicar_esquema(dados, avisar=False, colunas=[c for c in dados.columns if c not in descritas])
+
+def ler_arquivo(file, colunas=None, filtros=None, derivadas=True):
+    """
+    Lê um painel apenas com as colunas e linhas necessárias e retorna um DataFrame.
+    'colunas' é uma lista de nomes (None lê todas) e 'filtros' segue o formato do pyarrow,
+    por exemplo [("classe_individuo", "<=", 3)].
+    A projeção e os filtros são aplicados pelo pyarrow durante a leitura: colunas não pedidas
+    não são decodificadas e row groups cujas estatísticas não satisfazem o filtro são pulados.
+    As colunas derivadas vêm dos arquivos laterais (ver ler_tabela); com derivadas=False lê só o painel base.
+    """
+
+    return para_pandas(ler_tabela(file, colunas, filtros, derivadas=None if derivadas else {}))
+
+def ler_painel(ano, trimestre, colunas=None, filtros=None):
+    """
+    Lê o painel {ano}.{trimestre} com projeção de colunas e filtro de linhas (ver ler_arquivo).
+    """
+    return ler_arquivo(caminho_painel(ano, trimestre), colunas, filtros)
+
+def escrever_painel(dados, file):
+    """
+    Sobrescreve o painel com o df, em row groups de 'tamanho_row_group' linhas,
+    com as colunas nos tipos compactos do esquema (esquema.py).
+    A gravação é atômica (arquivo temporário + rename): uma execução interrompida não corrompe o painel.
+    """
+
+    # Se 'file' é o link com o nome antigo, o que é substituído é a partição para onde ele aponta
+    destino = os.path.realpath(file)
+    temporario = f"{destino}.{os.getpid()}.tmp"
+    aplicar_esquema(dados).to_parquet(temporario, index=False, row_group_size=tamanho_row_group)
+    os.replace(temporario, destino)
+
+def escrever_derivadas(dados, file):
+    """
+    Grava cada coluna do df em um arquivo lateral do painel (ver caminho_derivada), com o tipo do esquema.
+    O df deve ter uma linha para cada linha do painel, na mesma ordem (como o lido por ler_arquivo sem filtros).
+    Cada arquivo é gravado de forma atômica (arquivo temporário + rename) e leva nos metadados a assinatura
+    do painel (sha256 do rodapé) e o md5 do rodapé, usado pelos scripts em R.
+    """
+
+    linhas = pq.read_metadata(file).num_rows
+    if len(dados) != linhas:
+        raise ValueError(f"{len(dados)} linhas para as colunas derivadas, mas o painel {file} tem {linhas}.")
+
+    rodape = rodape_painel(file)
+    metadados = {
+        b"assinatura_painel": hashlib.sha256(rodape).hexdigest().encode(),
+        b"md5_rodape": hashlib.md5(rodape).hexdigest().encode(),
+    }
+
+    dados = aplicar_esquema(dados.reset_index(drop=True))
+
+    for coluna in dados.columns:
+        tabela = pa.Table.from_pandas(dados[[coluna]], preserve_index=False)
+        tabela = tabela.replace_schema_metadata({**(tabela.schema.metadata or {}), **metadados})
+
+        caminho = caminho_derivada(file, coluna)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        temporario = caminho.with_suffix(f".{os.getpid()}.tmp")
+        pq.write_table(tabela, temporario, row_group_size=tamanho_row_group)
+        os.replace(temporario, caminho)
+
+def converter_painel(file):
+    """
+    Valida os tipos de um painel já gravado e, se alguma coluna estiver fora do esquema,
+    reescreve o arquivo com os tipos compactos. Imprime o tamanho e a memória antes e depois.
+    As colunas derivadas válidas são regravadas com a assinatura do painel convertido.
+    """
+
+    dados = ler_arquivo(file, derivadas=False)
+    pendentes = colunas_fora_do_esquema(dados)
+
+    if not pendentes:
+        print(f"  {file} já está no esquema. Pulando.")
+        return
+
+    tamanho_antes = os.path.getsize(file)
+    memoria_antes = dados.memory_usage(deep=True).sum()
+    derivadas = derivadas_painel(file)
+    if derivadas:
+        valores_derivadas = ler_arquivo(file, colunas=list(derivadas))
+
+    dados = aplicar_esquema(dados)
+    escrever_painel(dados, file)
+
+    # A conversão não muda a ordem das linhas, então as colunas derivadas continuam alinhadas
+    if derivadas:
+        escrever_derivadas(valores_derivadas, file)
+
+    print(f"  {file}: {len(pendentes)} colunas convertidas; "
+          f"arquivo {tamanho_antes / 1e6:.1f} -> {os.path.getsize(file) / 1e6:.1f} MB, "
+          f"memória {memoria_antes / 1e6:.1f} -> {dados.memory_usage(deep=True).sum() / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move os painéis classificados para o dataset particionado por ano e trimestre.")
+    parser.add_argument("--sem-links", action="store_true",
+                        help="Não deixa um link com o nome antigo de cada painel migrado")
+    args = parser.parse_args()
+
+    migrar_paineis(manter_links=not args.sem_links)
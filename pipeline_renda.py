@@ -0,0 +1,53 @@
+import pandas as pd
+from paineis import caminho_painel, ler_arquivo, escrever_derivadas, colunas_painel
+from manifesto import hash_entradas, precisa_atualizar, registrar_transformacoes, registrar_contagem_classes
+from log_renda import calcular_log_renda, versao_log_renda
+from fixo_cluster_renda import calcular_faixas, versao_faixas
+from kmeans_cluster_renda import calcular_clusters, versao_clusters
+from agendador import criar_parser, executar_trimestres, listar_trimestres
+
+def processar_painel(ano, trimestre, k=2, forcar=False):
+    """
+    Lê do painel {ano}.{trimestre} só a renda e a classe, calcula 'log_renda', 'grupo_renda'
+    e 'grupo_renda_kmeans' em memória e grava cada uma no seu arquivo lateral (o painel não é reescrito).
+    Painéis cujas entradas e versões das transformações não mudaram são pulados (exceto com forcar=True).
+    """
+
+    file = caminho_painel(ano, trimestre)
+
+    hash_atual = hash_entradas(file)
+    versoes = {
+        "log_renda": versao_log_renda,
+        "grupo_renda": versao_faixas,
+        "grupo_renda_kmeans": versao_clusters(k, versao_log=versao_log_renda),
+    }
+
+    if not forcar and not precisa_atualizar(file, versoes, hash_atual):
+        print(f"{ano}.{trimestre} já está atualizado. Pulando.")
+        return
+
+    if "VD4019" not in colunas_painel(file):
+        print(f"  AVISO: Coluna 'VD4019' não encontrada em {file}. Pulando.")
+        return
+
+    dados = ler_arquivo(file, colunas=["VD4019", "classe_individuo"])
+
+    print(f"{ano}.{trimestre}")
+
+    # A ordem importa: o kmeans usa a coluna 'log_renda'
+    dados = calcular_log_renda(dados)
+    dados = calcular_faixas(dados, ano, trimestre)
+    dados = calcular_clusters(dados, k)
+
+    escrever_derivadas(dados[["log_renda", "grupo_renda", "grupo_renda_kmeans"]], file)
+    registrar_transformacoes(file, versoes, hash_atual)
+
+    # Histograma das classes de pareamento, usado pela contagem de classes sem reler o painel
+    registrar_contagem_classes(file, dados["classe_individuo"].value_counts().to_dict())
+
+if __name__ == "__main__":
+    parser = criar_parser("Calcula log_renda, grupo_renda e grupo_renda_kmeans lendo cada painel uma única vez.", incremental=True)
+    args = parser.parse_args()
+
+    tarefas = [(ano, trimestre, 2, args.forcar) for ano, trimestre in listar_trimestres(2024, 2)]
+    executar_trimestres(processar_painel, tarefas, args.workers)
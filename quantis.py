@@ -0,0 +1,137 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Sketch de quantis mesclável com erro relativo garantido (no estilo do DDSketch).
+# Cada valor x != 0 cai no bucket i = ceil(log_gamma(|x|)), com gamma = (1 + alpha) / (1 - alpha),
+# e é representado por 2 * gamma^i / (gamma + 1), que está a no máximo alpha * |x| de x.
+# O sketch guarda apenas as contagens por bucket: juntar sketches é somar contagens, sem perda,
+# então o resultado de uma janela (vários trimestres) é o mesmo de um sketch feito com todos os valores.
+#
+# Garantia de erro: o quantil q é estimado como no np.percentile (interpolação linear entre os elementos
+# de posição floor(q*(n-1)) e ceil(q*(n-1))), trocando cada elemento pelo representante do seu bucket.
+# Se x_lo e x_hi são esses elementos e f a fração da interpolação, o erro é no máximo
+# alpha * ((1 - f) * |x_lo| + f * |x_hi|); quando x_lo e x_hi têm o mesmo sinal, isso é alpha * |quantil exato|.
+# Valores com |x| < valor_minimo (inclusive as variações nulas) vão para o bucket do zero e são exatos.
+
+precisao_relativa = 0.01
+valor_minimo = 1e-9
+
+gamma = (1 + precisao_relativa) / (1 - precisao_relativa)
+log_gamma = np.log(gamma)
+
+# Deslocamento que torna positivas as chaves de todos os valores com |x| >= valor_minimo:
+# chave = sinal(x) * (i + deslocamento), e a chave 0 é o bucket do zero.
+# Assim, ordenar pelas chaves é ordenar pelos valores.
+deslocamento = 1 - int(np.floor(np.log(valor_minimo) / log_gamma))
+
+nome_arquivo_sketches = "sketches_variacao.parquet"
+
+def chaves_valores(valores):
+    """
+    Chave do bucket de cada valor (array de int32).
+    """
+
+    valores = np.asarray(valores, dtype=float)
+    modulo = np.abs(valores)
+    nao_nulos = modulo >= valor_minimo
+
+    chaves = np.zeros(len(valores), dtype=np.int32)
+    indices = np.ceil(np.log(modulo[nao_nulos]) / log_gamma).astype(np.int32)
+    chaves[nao_nulos] = np.sign(valores[nao_nulos]).astype(np.int32) * (indices + deslocamento)
+    return chaves
+
+def valores_chaves(chaves):
+    """
+    Valor representante de cada chave (inverso aproximado de chaves_valores).
+    """
+
+    chaves = np.asarray(chaves)
+    indices = np.abs(chaves) - deslocamento
+    valores = np.sign(chaves) * 2 * np.power(gamma, indices) / (gamma + 1)
+    return np.where(chaves == 0, 0.0, valores)
+
+def criar_sketch(valores):
+    """
+    Cria o sketch de um conjunto de valores finitos: (chaves ordenadas, contagens).
+    """
+
+    return np.unique(chaves_valores(valores), return_counts=True)
+
+def juntar_sketches(sketches):
+    """
+    Junta uma lista de sketches (chaves, contagens) em um só, somando as contagens de cada bucket.
+    """
+
+    sketches = list(sketches)
+    if not sketches:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+
+    chaves = np.concatenate([chaves for chaves, _ in sketches])
+    contagens = np.concatenate([contagens for _, contagens in sketches])
+
+    unicas, inverso = np.unique(chaves, return_inverse=True)
+    return unicas, np.bincount(inverso, weights=contagens).astype(np.int64)
+
+def quantil_sketch(sketch, q):
+    """
+    Estima o(s) quantil(is) q (escalar ou lista, entre 0 e 1) a partir de um sketch.
+    Retorna NaN se o sketch estiver vazio.
+    """
+
+    chaves, contagens = sketch
+    q = np.asarray(q, dtype=float)
+
+    if len(chaves) == 0:
+        return np.full(q.shape, np.nan) if q.ndim else np.nan
+
+    acumulado = np.cumsum(contagens)
+    posicao = q * (acumulado[-1] - 1)
+    baixo = np.floor(posicao)
+
+    # Bucket que contém o elemento de cada posição (primeiro com contagem acumulada maior que ela)
+    valor_baixo = valores_chaves(chaves[np.searchsorted(acumulado, baixo, side="right")])
+    valor_alto = valores_chaves(chaves[np.searchsorted(acumulado, np.ceil(posicao), side="right")])
+
+    return valor_baixo + (posicao - baixo) * (valor_alto - valor_baixo)
+
+def tabela_sketch(sketch, **identificacao):
+    """
+    Converte um sketch em linhas (identificação..., chave, contagem) para ser gravado em Parquet.
+    """
+
+    chaves, contagens = sketch
+    return pd.DataFrame({
+        **{coluna: valor for coluna, valor in identificacao.items()},
+        "chave": chaves.astype(np.int32),
+        "contagem": contagens.astype(np.int32),
+    })
+
+def carregar_sketches(pasta=Path("dados_medianas_var")):
+    """
+    Lê os sketches gravados por variacao_renda.py e os indexa por (grupo, deflacionado, ano_final, trimestre),
+    para que as consultas por janela não precisem filtrar a tabela.
+    """
+
+    tabela = pd.read_parquet(Path(pasta) / nome_arquivo_sketches)
+
+    indice = {}
+    for chave, df in tabela.groupby(["grupo", "deflacionado", "ano_final", "trimestre"], observed=True, sort=False):
+        grupo, deflacionado, ano_final, trimestre = chave
+        indice[(str(grupo), bool(deflacionado), int(ano_final), int(trimestre))] = (
+            df["chave"].to_numpy(), df["contagem"].to_numpy()
+        )
+    return indice
+
+def quantil_janela(sketches, grupo, deflacionado, trimestres, q=0.5):
+    """
+    Quantil q da variação de renda de 'grupo' juntando os trimestres de 'trimestres'
+    (lista de pares (ano_final, trimestre)), a partir do índice de carregar_sketches.
+    Ex.: mediana dos 4 trimestres de 2022 -> quantil_janela(s, "Base", True, [(2022, t) for t in range(1, 5)]).
+    Trimestres sem sketch são ignorados.
+    """
+
+    selecionados = [sketches[(grupo, deflacionado, ano, tri)]
+                    for ano, tri in trimestres
+                    if (grupo, deflacionado, ano, tri) in sketches]
+    return quantil_sketch(juntar_sketches(selecionados), q)
@@ -0,0 +1,34 @@
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+def painel_bruto(ano, trimestre, n=200, semente=0):
+    """
+    Painel pequeno no formato gravado pelo R: códigos como texto e rendas em float64.
+    """
+
+    rng = np.random.default_rng(semente)
+    return pd.DataFrame({
+        "ID_UNICO": [f"{ano}{trimestre}-{i // 2}" for i in range(n)],
+        "Ano": np.where(np.arange(n) % 2 == 0, str(ano), str(ano + 1)),
+        "Trimestre": str(trimestre),
+        "V2007": rng.choice(["1", "2"], n),
+        "classe_individuo": rng.choice([1.0, 2.0, 3.0, 4.0], n),
+        "VD4019": np.where(rng.random(n) < 0.2, np.nan, rng.lognormal(7, 1, n)),
+    })
+
+@pytest.fixture
+def pasta_paineis(tmp_path, monkeypatch):
+    """
+    Pasta de trabalho temporária com PNAD_data/Pareamentos, já como diretório atual
+    (os módulos usam caminhos relativos a ele).
+    """
+
+    monkeypatch.chdir(tmp_path)
+    pasta = tmp_path / "PNAD_data" / "Pareamentos"
+    pasta.mkdir(parents=True)
+    return pasta
@@ -0,0 +1,30 @@
+import pytest
+from conftest import painel_bruto
+
+duckdb = pytest.importorskip("duckdb")
+
+from paineis import caminho_antigo, converter_painel, migrar_paineis
+import consulta
+
+def test_conectar_com_paineis_migrados(pasta_paineis, tmp_path):
+    for trimestre in (1, 2):
+        painel_bruto(2020, trimestre, semente=trimestre).to_parquet(caminho_antigo(2020, trimestre), index=False)
+    migrar_paineis()
+
+    conexao = consulta.conectar(pasta_saidas=tmp_path / "saidas")
+    resultado = consulta.query(
+        "SELECT ano_inicio, trimestre_inicio, count(*) AS n FROM paineis GROUP BY ALL ORDER BY ALL", conexao
+    )
+
+    assert resultado[["ano_inicio", "trimestre_inicio"]].values.tolist() == [[2020, 1], [2020, 2]]
+    assert resultado["n"].tolist() == [200, 200]
+
+def test_paineis_convertidos_e_brutos_com_os_mesmos_tipos(pasta_paineis, tmp_path):
+    for trimestre in (1, 2):
+        painel_bruto(2020, trimestre, semente=trimestre).to_parquet(caminho_antigo(2020, trimestre), index=False)
+    converter_painel(caminho_antigo(2020, 1))
+
+    conexao = consulta.conectar(pasta_saidas=tmp_path / "saidas")
+    tipos = consulta.query("SELECT DISTINCT typeof(Ano) AS t, typeof(V2007) AS v FROM paineis", conexao)
+
+    assert tipos.values.tolist() == [["SMALLINT", "TINYINT"]]
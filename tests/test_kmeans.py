@@ -0,0 +1,41 @@
+import numpy as np
+import log_renda
+from conftest import painel_bruto
+from paineis import caminho_antigo, caminho_painel
+from manifesto import hash_entradas, precisa_atualizar, versao_registrada
+from kmeans_cluster_renda import ajustar_clusters, cluster, versao_clusters
+
+def rendas_teste(n=20_000, semente=0):
+    # log de rendas arredondadas a reais inteiros, com muitos valores repetidos, como na PNAD
+    rng = np.random.default_rng(semente)
+    return np.log(np.round(rng.lognormal(7.3, 0.9, n)) + 1)
+
+def test_histograma_igual_ao_sklearn_sem_centros_iniciais():
+    rendas = rendas_teste()
+
+    for k in (2, 3, 4):
+        labels_sklearn, centros_sklearn = ajustar_clusters(rendas, k, backend="sklearn")
+        labels_histograma, centros_histograma = ajustar_clusters(rendas, k, backend="histograma")
+
+        assert np.array_equal(labels_sklearn, labels_histograma)
+        assert np.allclose(centros_sklearn, centros_histograma)
+
+def test_nova_versao_de_log_renda_invalida_os_clusters(pasta_paineis, monkeypatch):
+    painel_bruto(2020, 2).to_parquet(caminho_antigo(2020, 2), index=False)
+    file = caminho_painel(2020, 2)
+
+    log_renda.processar_dados(file)
+    cluster(2020, 2, 2)
+
+    def versoes():
+        return {"grupo_renda_kmeans": versao_clusters(2, versao_log=versao_registrada(file, "log_renda"))}
+
+    assert not precisa_atualizar(file, versoes(), hash_entradas(file))
+
+    monkeypatch.setattr(log_renda, "versao_log_renda", "teste")
+    log_renda.processar_dados(file)
+    assert precisa_atualizar(file, versoes(), hash_entradas(file))
+
+def test_sequencial_depende_dos_centros_do_trimestre_anterior():
+    assert versao_clusters(2, centros_iniciais=[6.0, 7.6]) == versao_clusters(2, centros_iniciais=[7.6, 6.0])
+    assert versao_clusters(2, centros_iniciais=[6.0, 7.6]) != versao_clusters(2, centros_iniciais=[6.7, 8.1])
@@ -0,0 +1,34 @@
+from conftest import painel_bruto
+from paineis import caminho_antigo, converter_painel, ler_arquivo, ler_paineis
+from cache_paineis import ler_arquivo_cache
+from pipeline_renda import processar_painel
+from kmeans_cluster_renda import histograma_agrupado
+
+def test_ler_paineis_convertidos_e_brutos(pasta_paineis):
+    # 2020.1 convertido para os tipos compactos; 2020.2 gravado depois, ainda como o R grava
+    for trimestre in (1, 2):
+        painel_bruto(2020, trimestre, semente=trimestre).to_parquet(caminho_antigo(2020, trimestre), index=False)
+    converter_painel(caminho_antigo(2020, 1))
+
+    dados = ler_paineis(["Ano", "V2007", "VD4019"], [("classe_individuo", "<=", 3)])
+    assert dados["Ano"].dtype == "Int16"
+    assert dados["V2007"].dtype == "Int8"
+    assert set(dados["Ano"]) == {2020, 2021}
+
+    # Com colunas derivadas (arquivos laterais) em apenas um dos painéis
+    processar_painel(2020, 2, forcar=True)
+    dados = ler_paineis(["Ano", "log_renda", "grupo_renda_kmeans", "ano_inicio"], [("classe_individuo", "<=", 3)])
+    assert dados["Ano"].dtype == "Int16"
+    assert dados["grupo_renda_kmeans"].dtype == "Int8"
+    assert (dados["ano_inicio"] == 2020).all()
+
+    unicos, contagens = histograma_agrupado([(2020, 1), (2020, 2)])
+    assert contagens.sum() == dados["log_renda"].notna().sum()
+
+def test_ler_arquivo_cache_sem_colunas_retorna_todas(pasta_paineis):
+    painel = painel_bruto(2020, 2).assign(coluna_fora_do_cache=1)
+    painel.to_parquet(caminho_antigo(2020, 2), index=False)
+
+    dados = ler_arquivo_cache(caminho_antigo(2020, 2))
+    assert list(dados.columns) == list(ler_arquivo(caminho_antigo(2020, 2)).columns)
+    assert "coluna_fora_do_cache" in dados
@@ -0,0 +1,491 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from paineis import caminho_painel, colunas_painel
+from cache_paineis import ler_arquivo_cache
+from grupos import grupos_suffix
+from metricas import tipar_metricas, nome_arquivo_estatisticas
+from quantis import criar_sketch, tabela_sketch, nome_arquivo_sketches
+from bootstrap import intervalo_bootstrap, semente_bootstrap
+from cubo import tabela_cubo, nome_arquivo_cubo
+from agendador import criar_parser, executar_trimestres, listar_trimestres
+
+pasta_saida = Path("dados_medianas_var")
+
+# Mesmos critérios de calcular_variacoes (variacao_renda.R)
+regioes = {
+    "_5": [11, 12, 13, 14, 15, 16, 17],      # Norte
+    "_6": [21, 22, 23, 24, 25, 26, 27, 28, 29],  # Nordeste
+    "_7": [31, 32, 33, 34, 35],              # Sudeste
+    "_8": [41, 42, 43],                      # Sul
+    "_9": [50, 51, 52, 53],                  # Centro-Oeste
+}
+
+grupo_ocp = {
+    "1": [45, 48],  # Comércio
+    "2": [1, 2, 3, 41, 42, 43, 49, 50, 51, 52, 53, 55, 56, 58, 59, 60, 61, 62, 63, 64, 66, 68, 69, 70, 71, 72,
+          73, 74, 75, 77, 78, 79, 80, 81, 82, 84, 85, 86, 87, 88, 90, 91, 92, 93, 94, 95, 96, 97, 99],  # Serviços
+    "3": [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28, 29, 30,
+          31, 32, 33, 35, 36, 37, 38, 39],  # Indústria
+}
+
+# Coluna de renda por código de deflator
+colunas_renda = {"": "VD4019", "D": "VD4019_deflat"}
+
+# Colunas lidas de cada painel (as que não existirem no arquivo são ignoradas)
+colunas_variacao = [
+    "ID_UNICO", "Ano", "Trimestre", "classe_individuo", "VD4019", "VD4019_deflat",
+    "plataforma_transporte", "plataforma_entrega", "job_switcher", "V2007", "UF", "V4029",
+    "V2009", "V2010", "VD3004", "V4010", "V4013", "grupo_renda", "grupo_renda_kmeans",
+]
+
+# Estatística gravada na coluna 'mediana_variacao' do CSV de cada grupo (padrão: mediana)
+estatistica_grupo = {"_11": "media", "_12": "p25", "_13": "p75"}
+
+# Estatísticas calculadas para todos os grupos; ic_inferior e ic_superior são o intervalo de confiança
+# (bootstrap) da estatística gravada no CSV do grupo
+estatisticas = ["mediana", "media", "p25", "p75", "percentual_zero", "percentual_menor_igual_zero",
+                "ic_inferior", "ic_superior"]
+
+def mascaras_grupos(dados):
+    """
+    Calcula, linha a linha, a máscara de pertencimento a cada grupo de grupos_suffix ({sufixo: array bool}).
+    Grupos que dependem de colunas ausentes no painel ficam de fora.
+    """
+
+    def numerica(coluna):
+        return pd.to_numeric(dados[coluna], errors="coerce").to_numpy(dtype=float)
+
+    n = len(dados)
+    mascaras = {"_0": np.ones(n, dtype=bool)}
+
+    # Média e percentis são estatísticas da Base
+    for sufixo in estatistica_grupo:
+        mascaras[sufixo] = mascaras["_0"]
+
+    if {"plataforma_transporte", "plataforma_entrega"} <= set(dados.columns):
+        mascaras["_1"] = (numerica("plataforma_transporte") == 1) | (numerica("plataforma_entrega") == 1)
+
+    if "job_switcher" in dados:
+        mascaras["_2"] = numerica("job_switcher") == 1
+
+    if "V2007" in dados:
+        sexo = numerica("V2007")
+        mascaras["_3"] = sexo == 1
+        mascaras["_4"] = sexo == 2
+
+    if "UF" in dados:
+        uf = numerica("UF")
+        for sufixo, ufs in regioes.items():
+            mascaras[sufixo] = np.isin(uf, ufs)
+
+    if "V4029" in dados:
+        mascaras["_10"] = numerica("V4029") == 1
+
+    if "V2009" in dados:
+        idade = numerica("V2009")
+        mascaras["_14"] = (idade >= 14) & (idade <= 24)
+        mascaras["_15"] = (idade >= 25) & (idade <= 54)
+        mascaras["_16"] = idade >= 55
+
+    if "V2010" in dados:
+        cor = numerica("V2010")
+        for codigo in range(1, 6):
+            mascaras[f"_17{codigo}"] = cor == codigo
+
+    if "VD3004" in dados:
+        educacao = numerica("VD3004")
+        for codigo in range(1, 8):
+            mascaras[f"_18{codigo}"] = educacao == codigo
+
+    if "V4010" in dados:
+        # "Grandes Grupos" de ocupação: primeiro dígito do código
+        ocupacao = numerica("V4010") // 1000
+        for codigo in range(10):
+            mascaras[f"_19{codigo}"] = ocupacao == codigo
+
+    if "V4013" in dados:
+        divisao = numerica("V4013") // 1000
+        for codigo, divisoes in grupo_ocp.items():
+            mascaras[f"_20{codigo}"] = np.isin(divisao, divisoes)
+
+    if "grupo_renda" in dados:
+        classe = dados["grupo_renda"].astype(object).to_numpy()
+        for letra in "ABCDE":
+            mascaras[f"_21{letra}"] = classe == letra
+
+    if "grupo_renda_kmeans" in dados:
+        cluster = numerica("grupo_renda_kmeans")
+        for codigo in range(2):
+            mascaras[f"_22_{codigo}"] = cluster == codigo
+
+    # Mantém apenas os grupos exibidos, na ordem de grupos_suffix
+    return {sufixo: mascaras[sufixo] for sufixo in grupos_suffix.values() if sufixo in mascaras}
+
+def codigos_dimensoes(dados):
+    """
+    Calcula, linha a linha, o código int8 de cada dimensão do cubo (ver dimensoes_cubo em cubo.py),
+    com os mesmos critérios de mascaras_grupos. Valores ausentes ou fora das categorias recebem -1.
+    Dimensões que dependem de colunas ausentes no painel ficam de fora.
+    """
+
+    def numerica(coluna):
+        return pd.to_numeric(dados[coluna], errors="coerce").to_numpy(dtype=float)
+
+    def codificar(valores, validos):
+        codigos = np.full(len(valores), -1, dtype=np.int8)
+        aceitos = np.isin(valores, validos)
+        codigos[aceitos] = valores[aceitos].astype(np.int8)
+        return codigos
+
+    codigos = {}
+
+    if "V2007" in dados:
+        codigos["sexo"] = codificar(numerica("V2007"), [1, 2])
+
+    if "UF" in dados:
+        uf = numerica("UF")
+        codigos["uf"] = codificar(uf, [uf_regiao for ufs in regioes.values() for uf_regiao in ufs])
+        codigos["regiao"] = np.full(len(uf), -1, dtype=np.int8)
+        for codigo, ufs in enumerate(regioes.values(), start=1):
+            codigos["regiao"][np.isin(uf, ufs)] = codigo
+
+    if "V2009" in dados:
+        idade = numerica("V2009")
+        codigos["faixa_idade"] = np.select(
+            [(idade >= 14) & (idade <= 24), (idade >= 25) & (idade <= 54), idade >= 55], [1, 2, 3], -1
+        ).astype(np.int8)
+
+    if "V2010" in dados:
+        codigos["cor"] = codificar(numerica("V2010"), range(1, 6))
+
+    if "VD3004" in dados:
+        codigos["educacao"] = codificar(numerica("VD3004"), range(1, 8))
+
+    if "V4010" in dados:
+        codigos["ocupacao"] = codificar(numerica("V4010") // 1000, range(10))
+
+    if "V4013" in dados:
+        divisao = numerica("V4013") // 1000
+        codigos["divisao"] = np.full(len(divisao), -1, dtype=np.int8)
+        for codigo, divisoes in grupo_ocp.items():
+            codigos["divisao"][np.isin(divisao, divisoes)] = int(codigo)
+
+    if "V4029" in dados:
+        codigos["carteira"] = codificar(numerica("V4029"), [1, 2])
+
+    if {"plataforma_transporte", "plataforma_entrega"} <= set(dados.columns):
+        codigos["app"] = ((numerica("plataforma_transporte") == 1) |
+                          (numerica("plataforma_entrega") == 1)).astype(np.int8)
+
+    return codigos
+
+def calcular_variacao(renda_primeiro, renda_ultimo):
+    """
+    Variação (ultimo - primeiro) / primeiro; NaN quando alguma renda falta ou é zero.
+    """
+
+    validas = (np.isfinite(renda_primeiro) & np.isfinite(renda_ultimo) &
+               (renda_primeiro != 0) & (renda_ultimo != 0))
+    variacao = np.full(len(renda_primeiro), np.nan)
+    variacao[validas] = (renda_ultimo[validas] - renda_primeiro[validas]) / renda_primeiro[validas]
+    return variacao
+
+def resumir_variacoes(variacoes):
+    """
+    Estatísticas das variações de um grupo: obs, mediana, média, p25, p75 e proporções de variação nula.
+    """
+
+    obs = len(variacoes)
+    if obs == 0:
+        return {"obs": 0, **{nome: np.nan for nome in estatisticas}}
+
+    p25, mediana, p75 = np.percentile(variacoes, [25, 50, 75])
+    return {
+        "obs": obs,
+        "mediana": mediana,
+        "media": variacoes.mean(),
+        "p25": p25,
+        "p75": p75,
+        "percentual_zero": np.mean(variacoes == 0),
+        "percentual_menor_igual_zero": np.mean(variacoes <= 0),
+    }
+
+def variacoes_painel(ano, trimestre):
+    """
+    Lê o painel {ano}.{trimestre} -> {ano+1}.{trimestre} uma única vez e calcula as estatísticas
+    da variação de renda entre a primeira e a quinta entrevista para todos os grupos e deflatores.
+    Retorna uma tupla (resultados, sketches, cubo): um DataFrame com uma linha por (sufixo, deflator),
+    outro com o sketch de quantis (quantis.py) de cada um e as linhas do cubo de variações (cubo.py)
+    do trimestre; ou None se o painel não existir.
+    """
+
+    file = caminho_painel(ano, trimestre)
+
+    # caso o arquivo nao exista
+    if not file.exists():
+        print(f"Arquivo não encontrado, pulando: {file}")
+        return None
+
+    print(f"Processando: {ano}_{trimestre} -> {ano+1}_{trimestre}")
+
+    colunas = [c for c in colunas_variacao if c in colunas_painel(file)]
+    dados = ler_arquivo_cache(file, colunas=colunas, filtros=[("classe_individuo", "in", [1.0, 2.0, 3.0])])
+
+    # Apenas as entrevistas do primeiro e do último trimestre do painel
+    ano_linha = pd.to_numeric(dados["Ano"], errors="coerce")
+    tri_linha = pd.to_numeric(dados["Trimestre"], errors="coerce")
+    eh_primeiro = ((ano_linha == ano) & (tri_linha == trimestre)).to_numpy()
+    eh_ultimo = ((ano_linha == ano + 1) & (tri_linha == trimestre)).to_numpy()
+
+    manter = eh_primeiro | eh_ultimo
+    dados = dados[manter].reset_index(drop=True)
+    eh_ultimo = eh_ultimo[manter]
+    ids = dados["ID_UNICO"].to_numpy()
+
+    mascaras = mascaras_grupos(dados)
+    codigos = codigos_dimensoes(dados)
+
+    # Indivíduos com mais de uma linha no mesmo trimestre precisam da mediana da renda por trimestre
+    # (como no summarise do R); os demais são pareados diretamente, sem group-by
+    repetidos = pd.DataFrame({"id": ids, "ultimo": eh_ultimo}).duplicated(keep=False).to_numpy()
+    lento = np.isin(ids, np.unique(ids[repetidos]))
+
+    linhas = np.arange(len(dados))
+    pos_primeiro = pd.Series(linhas[~lento & ~eh_ultimo], index=ids[~lento & ~eh_ultimo])
+    pos_ultimo = pd.Series(linhas[~lento & eh_ultimo], index=ids[~lento & eh_ultimo])
+    comuns = pos_primeiro.index.intersection(pos_ultimo.index)
+    ip = pos_primeiro.loc[comuns].to_numpy()
+    iu = pos_ultimo.loc[comuns].to_numpy()
+
+    resultados = []
+    sketches = []
+    rendas_cubo = {}
+    variacoes_cubo = {}
+    nomes_grupos = {sufixo: grupo for grupo, sufixo in grupos_suffix.items()}
+    posicoes_grupos = {sufixo: i for i, sufixo in enumerate(grupos_suffix.values())}
+
+    for codigo, coluna_renda in colunas_renda.items():
+        if coluna_renda not in dados:
+            print(f"  AVISO: coluna {coluna_renda} ausente em {file}, pulando deflator '{codigo}'")
+            continue
+
+        renda = pd.to_numeric(dados[coluna_renda], errors="coerce").to_numpy(dtype=float)
+        variacao = calcular_variacao(renda[ip], renda[iu])
+        variacao_valida = np.isfinite(variacao)
+
+        coluna_cubo = "variacao_deflat" if codigo == "D" else "variacao"
+        rendas_cubo[coluna_cubo] = renda
+        variacoes_cubo[coluna_cubo] = variacao
+
+        for sufixo, mascara in mascaras.items():
+            # O filtro vale linha a linha: o indivíduo entra se as duas entrevistas estão no grupo
+            selecionados = mascara[ip] & mascara[iu] & variacao_valida
+            variacoes = variacao[selecionados]
+
+            if lento.any():
+                variacoes = np.concatenate([variacoes, variacoes_repetidos(ids, eh_ultimo, renda, mascara & lento)])
+
+            # Semente própria para cada (trimestre, grupo, deflator): o resultado não depende
+            # da ordem de execução nem do número de workers
+            rng = np.random.default_rng([semente_bootstrap, ano, trimestre, posicoes_grupos[sufixo], int(codigo == "D")])
+            ic_inferior, ic_superior = intervalo_bootstrap(variacoes, estatistica_grupo.get(sufixo, "mediana"), rng)
+
+            resultados.append({
+                "sufixo": sufixo,
+                "deflator": codigo,
+                "ano_final": ano + 1,
+                "trimestre": trimestre,
+                **resumir_variacoes(variacoes),
+                "ic_inferior": ic_inferior,
+                "ic_superior": ic_superior,
+            })
+
+            # Média e percentis são estatísticas da Base: o sketch da Base já os atende
+            if sufixo not in estatistica_grupo:
+                sketches.append(tabela_sketch(
+                    criar_sketch(variacoes),
+                    grupo=nomes_grupos[sufixo], deflacionado=codigo == "D", ano_final=ano + 1, trimestre=trimestre,
+                ))
+
+    # Cubo: dimensões comuns às duas entrevistas (-1 quando mudam) e variações com e sem deflator
+    codigos_cubo = {dimensao: np.where(valores[ip] == valores[iu], valores[ip], -1)
+                    for dimensao, valores in codigos.items()}
+    for coluna_cubo in ["variacao", "variacao_deflat"]:
+        variacoes_cubo.setdefault(coluna_cubo, np.full(len(ip), np.nan))
+
+    if lento.any():
+        codigos_lentos, variacoes_lentas = cubo_repetidos(ids, eh_ultimo, rendas_cubo, codigos, lento)
+        n_lentos = len(variacoes_lentas["id"])
+        codigos_cubo = {dimensao: np.concatenate([valores, codigos_lentos[dimensao]])
+                        for dimensao, valores in codigos_cubo.items()}
+        variacoes_cubo = {coluna: np.concatenate([valores, variacoes_lentas.get(coluna, np.full(n_lentos, np.nan))])
+                          for coluna, valores in variacoes_cubo.items()}
+
+    cubo = tabela_cubo(codigos_cubo, variacoes_cubo, ano + 1, trimestre)
+    cubo = cubo[cubo["variacao"].notna() | cubo["variacao_deflat"].notna()].reset_index(drop=True)
+
+    return pd.DataFrame(resultados), pd.concat(sketches, ignore_index=True), cubo
+
+def variacoes_repetidos(ids, eh_ultimo, renda, selecionados):
+    """
+    Variações dos indivíduos com linhas repetidas em um trimestre: mediana da renda por
+    (indivíduo, trimestre) entre as linhas selecionadas e, em seguida, a variação.
+    """
+
+    if not selecionados.any():
+        return np.empty(0)
+
+    medianas = (pd.DataFrame({"id": ids[selecionados], "ultimo": eh_ultimo[selecionados], "renda": renda[selecionados]})
+                  .groupby(["id", "ultimo"])["renda"].median()
+                  .unstack())
+
+    if True not in medianas or False not in medianas:
+        return np.empty(0)
+
+    variacao = calcular_variacao(medianas[False].to_numpy(), medianas[True].to_numpy())
+    return variacao[np.isfinite(variacao)]
+
+def cubo_repetidos(ids, eh_ultimo, rendas, codigos, lento):
+    """
+    Linhas do cubo dos indivíduos com linhas repetidas em um trimestre: variação entre as medianas
+    da renda por (indivíduo, trimestre) e, em cada dimensão, um código presente tanto em alguma linha
+    da primeira quanto em alguma da quinta entrevista (o menor, se houver mais de um; -1 se não houver).
+    Retorna ({dimensao: array}, {coluna de variação: array, "id": array}), alinhados por indivíduo.
+    """
+
+    linhas = pd.DataFrame({
+        "id": ids[lento],
+        "ultimo": eh_ultimo[lento],
+        **{coluna: renda[lento] for coluna, renda in rendas.items()},
+        **{dimensao: valores[lento] for dimensao, valores in codigos.items()},
+    })
+
+    individuos = pd.Index(np.unique(linhas["id"]))
+
+    codigos_lentos = {}
+    for dimensao in codigos:
+        # Códigos que aparecem nas duas entrevistas do indivíduo
+        entrevistas = linhas[linhas[dimensao] >= 0].groupby(["id", dimensao])["ultimo"].nunique()
+        comuns = entrevistas[entrevistas == 2].reset_index().groupby("id")[dimensao].min()
+        codigos_lentos[dimensao] = comuns.reindex(individuos, fill_value=-1).to_numpy(dtype=np.int8)
+
+    variacoes_lentas = {"id": individuos.to_numpy()}
+    for coluna in rendas:
+        medianas = linhas.groupby(["id", "ultimo"])[coluna].median().unstack().reindex(
+            index=individuos, columns=[False, True]
+        )
+        variacoes_lentas[coluna] = calcular_variacao(medianas[False].to_numpy(), medianas[True].to_numpy())
+
+    return codigos_lentos, variacoes_lentas
+
+def salvar_csvs(resultados, pasta=pasta_saida):
+    """
+    Grava, para cada grupo e deflator, o CSV medianas_variacao_renda{sufixo}{D}.csv
+    (ano_final, trimestre, mediana_variacao, obs) e o TXT com o resumo de cada trimestre,
+    no mesmo formato de calcular_variacoes; e o estatisticas_variacao_nula.csv da Base sem deflator.
+    """
+
+    pasta = Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+
+    for (sufixo, codigo), df in resultados.groupby(["sufixo", "deflator"], sort=False):
+        estatistica = estatistica_grupo.get(sufixo, "mediana")
+        df_saida = pd.DataFrame({
+            "ano_final": df["ano_final"],
+            "trimestre": df["trimestre"],
+            "mediana_variacao": df[estatistica],
+            "obs": df["obs"],
+        })
+        df_saida.to_csv(pasta / f"medianas_variacao_renda{sufixo}{codigo}.csv", index=False)
+
+        with open(pasta / f"medianas_variacao_renda{sufixo}{codigo}.txt", "w", encoding="utf-8") as f:
+            for linha in df_saida.itertuples():
+                f.write(f"Mediana da variação de renda ({linha.ano_final - 1}_{linha.trimestre} -> "
+                        f"{linha.ano_final}_{linha.trimestre}): {linha.mediana_variacao:.1%}\n")
+
+    base = resultados[(resultados["sufixo"] == "_0") & (resultados["deflator"] == "")]
+    base[["ano_final", "trimestre", "percentual_zero", "percentual_menor_igual_zero"]].to_csv(
+        pasta / "estatisticas_variacao_nula.csv", index=False
+    )
+
+    print(f"CSVs de variação de renda salvos em: {pasta}")
+
+def formato_longo(resultados):
+    """
+    Converte os resultados para o formato longo da tabela de métricas
+    (grupo, deflacionado, ano_final, trimestre, estatistica, valor, obs), com todas as estatísticas.
+    """
+
+    nomes_grupos = {sufixo: grupo for grupo, sufixo in grupos_suffix.items()}
+
+    longo = resultados.melt(
+        id_vars=["sufixo", "deflator", "ano_final", "trimestre", "obs"],
+        value_vars=estatisticas,
+        var_name="estatistica",
+        value_name="valor",
+    )
+
+    return tipar_metricas(pd.DataFrame({
+        "grupo": longo["sufixo"].map(nomes_grupos),
+        "deflacionado": longo["deflator"] == "D",
+        "ano_final": longo["ano_final"],
+        "trimestre": longo["trimestre"],
+        "estatistica": longo["estatistica"],
+        "valor": longo["valor"],
+        "obs": longo["obs"],
+    }))
+
+def gerar_variacoes(ultimo_ano_disponivel, ultimo_tri_disponivel, workers=1, pasta=pasta_saida):
+    """
+    Calcula as estatísticas de variação de renda de todos os grupos lendo cada painel uma única vez
+    e grava os CSVs por grupo, o CSV de variação nula, o arquivo longo com todas as estatísticas,
+    os sketches de quantis (para consultas por janela sem reler os painéis) e o cubo de variações
+    por indivíduo (para filtros combinados no app).
+    Com workers > 1 os trimestres são processados em paralelo.
+    """
+
+    trimestres = listar_trimestres(ultimo_ano_disponivel - 1, ultimo_tri_disponivel)
+
+    print(f"Calculando variações de renda para {len(trimestres)} trimestres")
+
+    resultados = executar_trimestres(variacoes_painel, trimestres, workers)
+
+    # Mantém a ordem dos trimestres e descarta os que falharam ou não existem
+    partes = [resultado for _, resultado, _ in resultados if resultado is not None]
+
+    if not partes:
+        print("Nenhum painel processado para variação de renda.")
+        return None
+
+    resultados = pd.concat([estatisticas_painel for estatisticas_painel, _, _ in partes], ignore_index=True)
+    sketches = pd.concat([sketches_painel for _, sketches_painel, _ in partes], ignore_index=True)
+    cubo = pd.concat([cubo_painel for _, _, cubo_painel in partes], ignore_index=True)
+
+    salvar_csvs(resultados, pasta)
+
+    path_estatisticas = Path(pasta) / nome_arquivo_estatisticas
+    formato_longo(resultados).to_parquet(path_estatisticas, index=False)
+    print(f"Estatísticas de variação salvas em: {path_estatisticas}")
+
+    path_sketches = Path(pasta) / nome_arquivo_sketches
+    sketches.astype({
+        "grupo": pd.CategoricalDtype(list(grupos_suffix)),
+        "ano_final": "int16",
+        "trimestre": "int8",
+    }).to_parquet(path_sketches, index=False)
+    print(f"Sketches de quantis salvos em: {path_sketches}")
+
+    path_cubo = Path(pasta) / nome_arquivo_cubo
+    cubo.to_parquet(path_cubo, index=False)
+    print(f"Cubo de variações salvo em: {path_cubo} ({len(cubo)} linhas)")
+
+    return resultados
+
+if __name__ == "__main__":
+    parser = criar_parser("Calcula as estatísticas de variação de renda de todos os grupos, lendo cada painel uma vez.")
+    parser.add_argument("ultimo_ano", type=int, help="Ano mais recente (T5) com dados completos")
+    parser.add_argument("ultimo_tri", type=int, help="Trimestre mais recente (T5) com dados completos")
+    args = parser.parse_args()
+
+    gerar_variacoes(args.ultimo_ano, args.ultimo_tri, args.workers)